@@ -0,0 +1,46 @@
+# calibrate.py Calibrate the touch panel by fitting a model to taps on targets.
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Does not use the GUI: the display and touch panel are driven synchronously.
+# Tap each cross in turn with a stylus. Affine and bilinear calibrations are
+# fitted and printed with their residual errors, in pixels, at the targets. Pass
+# the chosen calibration tuple to the TOUCH constructor in tft_local.py.
+
+from tft.driver.tft import LANDSCAPE
+from tft.driver.ugui import TFT_G
+from tft.driver.touch_bytecode import TOUCH
+from tft.driver.touch_cal import fit
+from tft.driver.constants import *
+
+_INSET = const(20)  # Distance of outer targets from edge of screen
+_ARM = const(10)  # Length of each arm of a target
+
+def cross(tft, x, y, color):
+    tft.drawHLine(x - _ARM, y, 2 * _ARM + 1, color)
+    tft.drawVLine(x, y - _ARM, 2 * _ARM + 1, color)
+
+# Targets lie on an n x n grid
+def test(n=3):
+    tft = TFT_G("SSD1963", "LB04301", LANDSCAPE)
+    tft.backlight(100) # Remove if you don't have backlight control hardware
+    touch = TOUCH("XPT2046", confidence = 10, margin = 30)
+    width, height = tft.getScreensize()
+    targets = []
+    for row in range(n):
+        for col in range(n):
+            targets.append((_INSET + col * (width - 1 - 2 * _INSET) // (n - 1),
+                            _INSET + row * (height - 1 - 2 * _INSET) // (n - 1)))
+    raw = []
+    for x, y in targets:
+        cross(tft, x, y, YELLOW)
+        raw.append(touch.get_touch(raw = True))
+        cross(tft, x, y, GREEN)
+    for bilinear in (False, True):
+        cal, rms, worst = fit(raw, targets, bilinear)
+        print('{} rms error {:4.1f} max {:4.1f}'.format('Bilinear' if bilinear else 'Affine  ', rms, worst))
+        print('calibration =', cal)
+    tft.clrSCR()
+
+test()
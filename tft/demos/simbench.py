@@ -0,0 +1,478 @@
+# simbench.py Measure the rendering cost of GUI objects on a simulated display.
+# Adapted for (and requires) uasyncio V3
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2020 Peter Hinch
+
+# Runs where the pyb module is absent, e.g. the Unix build of MicroPython:
+# tft.py then uses the simulated TFT_sim module in place of TFT_io.
+# Each object on a test screen is redrawn in full and the resultant bus
+# activity is reported, as is that of a sequence of small value changes such as
+# occur when a control is dragged, with and without a shadow framebuffer. A
+# snapshot of the display is written to simbench.png.
+# The WR16 column estimates the WR strobes on a 16 bit RGB565 bus, where each
+# pixel takes one strobe rather than three. The Pyboard wiring provides only an
+# 8 bit bus, on which the SSD1963 requires 24 bit color: see HARDWARE.md.
+# The costs of dispatching a touch, of filtering touch samples and of fixed
+# point trigonometry, which are independent of the display, are also reported.
+# The interrupt driven touch sampling is checked against a simulated pen.
+
+import uasyncio as asyncio
+import gc
+import math
+from utime import ticks_us, ticks_diff
+from tft.driver import TFT_sim
+from tft.driver.tft import LANDSCAPE
+from tft.driver.constants import *
+from tft.driver.ugui import Screen, TFT_G, Touchable
+from tft.driver.touch_filter import TouchFilter, MEAN, MEDIAN, IIR
+from tft.driver.touch_sampler import TouchSampler
+from tft.driver.touch_cal import fixed
+from tft.driver import trig
+
+from tft.widgets.label import Label
+from tft.widgets.buttons import Button
+from tft.widgets.checkbox import Checkbox
+from tft.widgets.led import LED
+from tft.widgets.meter import Meter
+from tft.widgets.dial import Dial
+from tft.widgets.knob import Knob
+from tft.widgets.slider import Slider
+from tft.widgets.horiz_slider import HorizSlider
+from tft.widgets.listbox import Listbox
+from tft.widgets.dropdown import Dropdown
+from tft.widgets.dialog import DialogBox
+
+from tft.fonts import font14
+from tft.fonts import font10
+
+class BenchScreen(Screen):
+    def __init__(self):
+        super().__init__()
+        Label((0, 0), font = font14, value = 'Simulated display')
+        Button((0, 30), font = font14, fontcolor = BLACK, fgcolor = GREEN, text = 'Circle')
+        Button((60, 30), font = font14, fontcolor = BLACK, fgcolor = CYAN, text = 'Rect',
+               shape = RECTANGLE, width = 80)
+        Button((150, 30), font = font14, fontcolor = BLACK, fgcolor = YELLOW, text = 'Clip',
+               shape = CLIPPED_RECT, width = 80)
+        Checkbox((240, 30), fillcolor = RED, value = True)
+        LED((280, 30), border = 2, color = GREEN).value(True)
+        Meter((440, 0), font = font10, legends = ('0', '5', '10'), value = 0.3)
+        Dial((330, 0), border = 2, pointers = (0.9, 0.7)).value(1.0)
+        Knob((0, 90), fgcolor = GREEN, color = GREY, value = 0.6)
+        Slider((120, 90), font = font10, height = 100, legends = ('0', '5', '10'), value = 0.7)
+        HorizSlider((200, 140), font = font10, legends = ('0', '5', '10'), value = 0.4)
+        Listbox((0, 200), font = font10, elements = ('Dog', 'Cat', 'Rat'), width = 100)
+        Dropdown((120, 220), font = font14, elements = ('Apple', 'Pear'), width = 150)
+
+class ListScreen(Screen): # A Listbox showing 12 of 40 entries
+    def __init__(self):
+        super().__init__()
+        self.listbox = Listbox((0, 0), font = font14, width = 200, nrows = 12,
+                               elements = ['Entry {}'.format(n) for n in range(40)])
+
+def report(name, stats):
+    print('{:14s}{:>9d}{:>9d}{:>9d}{:>7d}{:>7d}{:>9d}'.format(name, stats['wr'],
+          stats['wr'] - 2 * stats['pixels'], stats['rd'],
+          stats['setxy'], stats['reads'], stats['pixels']))
+
+# Bus activity of 20 small value changes of each control with a moving part
+def updates(screen):
+    for obj in screen.displaylist:
+        if isinstance(obj, (Meter, Dial, Knob, Slider, HorizSlider)):
+            TFT_sim.reset_stats()
+            for n in range(20):
+                v = 0.2 + n / 50
+                obj.value(v * 6.28 if isinstance(obj, Dial) else v)
+            report(obj.__class__.__name__ + ' x20', TFT_sim.stats())
+    # A Label used as a numeric readout: only changed glyphs are drawn unless
+    # redraw is set, which forces a full redraw.
+    label = screen.displaylist[0]
+    text = label.value()
+    for full in (False, True):
+        label.value('Reading {:6.2f}'.format(99))
+        TFT_sim.reset_stats()
+        for n in range(20):
+            label.redraw = full
+            label.value('Reading {:6.2f}'.format(100 + n * 1.37))
+        report('Label x20 full' if full else 'Label x20', TFT_sim.stats())
+    label.value(text)
+
+# Repeat the updates with a shadow framebuffer covering the screen: reads are
+# served from RAM. Also time reading a 32x32 area with and without it.
+def shadow(screen):
+    tft = Screen.tft
+    buf = bytearray(32 * 32 * 3)
+    for tiles in (135, 0):
+        tft.tft_init("SSD1963", "LB04301", LANDSCAPE, shadow = tiles)
+        Screen.show()
+        if tiles:
+            print('With a shadow framebuffer')
+            updates(screen)
+            sh = tft.getShadow()
+            print('Shadow of {} tiles uses {} bytes'.format(sh.ntiles, sh.memory()))
+        t = ticks_us()
+        tft.readArea(100, 100, 131, 131, buf)
+        print('Read 32x32 pixels {} shadow: {}us'.format('with' if tiles else 'without',
+              ticks_diff(ticks_us(), t)))
+
+# The per pixel drawCircle and O(r^2) fillCircle which the cached spans
+# replaced, kept as a reference for their cost.
+def old_draw_circle(tft, x, y, radius, color):
+    colorvect = bytearray(color)
+    f = 1 - radius
+    ddF_x = 1
+    ddF_y = -2 * radius
+    x1 = 0
+    y1 = radius
+    tft.drawPixel(x, y + radius, colorvect)
+    tft.drawPixel(x, y - radius, colorvect)
+    tft.drawPixel(x + radius, y, colorvect)
+    tft.drawPixel(x - radius, y, colorvect)
+    while x1 < y1:
+        if f >= 0:
+            y1 -= 1
+            ddF_y += 2
+            f += ddF_y
+        x1 += 1
+        ddF_x += 2
+        f += ddF_x
+        tft.drawPixel(x + x1, y + y1, colorvect)
+        tft.drawPixel(x - x1, y + y1, colorvect)
+        tft.drawPixel(x + x1, y - y1, colorvect)
+        tft.drawPixel(x - x1, y - y1, colorvect)
+        tft.drawPixel(x + y1, y + x1, colorvect)
+        tft.drawPixel(x - y1, y + x1, colorvect)
+        tft.drawPixel(x + y1, y - x1, colorvect)
+        tft.drawPixel(x - y1, y - x1, colorvect)
+
+def old_fill_circle(tft, x, y, radius, color):
+    r_square = radius * radius * 4
+    for y1 in range (-(radius * 2), 1):
+        y_square = y1 * y1
+        for x1 in range (-(radius * 2), 1):
+            if x1*x1+y_square <= r_square:
+                x1i = x1 // 2
+                y1i = y1 // 2
+                tft.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
+                tft.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
+                break
+
+# Circles are centred on the screen: larger ones are clipped by the simulator.
+# Each is drawn by the reference code (Old) and by the current code.
+def circles():
+    tft = Screen.tft
+    draw = lambda x, y, r, c: old_draw_circle(tft, x, y, r, c)
+    fill = lambda x, y, r, c: old_fill_circle(tft, x, y, r, c)
+    print('{:>6s}{:>10s}{:>9s}{:>10s}{:>9s}{:>10s}{:>9s}{:>10s}{:>9s}'.format('Radius',
+          'Old draw', 'us', 'Draw WR', 'us', 'Old fill', 'us', 'Fill WR', 'us'))
+    for radius in (5, 10, 20, 50, 100, 200):
+        tft._circles.clear()  # Include the cost of rasterisation
+        results = []
+        for func in (draw, tft.drawCircle, fill, tft.fillCircle):
+            TFT_sim.reset_stats()
+            t = ticks_us()
+            func(240, 136, radius, YELLOW)
+            results.append(TFT_sim.stats()['wr'])
+            results.append(ticks_diff(ticks_us(), t))
+        print('{:>6d}{:>10d}{:>9d}{:>10d}{:>9d}{:>10d}{:>9d}{:>10d}{:>9d}'.format(radius, *results))
+    tft.clrSCR()
+
+# Once a color has been used, obtaining its byte array or greyed equivalent
+# should not allocate.
+def allocation():
+    tft = Screen.tft
+    colors = (RED, GREEN, BLUE, YELLOW, GREY, WHITE)
+    for grey in (False, True, False):
+        tft.usegrey(grey)
+        for color in colors: # Populate caches
+            tft._vect(tft._getcolor(color), None)
+        gc.collect()
+        start = gc.mem_alloc()
+        n = 100
+        while n:
+            for color in colors:
+                tft._vect(tft._getcolor(color), None)
+            n -= 1
+        used = gc.mem_alloc() - start
+        print('Color lookup allocation (greyed {}): {} bytes'.format(grey, used))
+        assert used == 0, 'Color lookup allocated memory'
+    tft.usegrey(False)
+
+# Minimal touchable: a 20 pixel square which counts its touches
+class Pad(Touchable):
+    def __init__(self, location):
+        super().__init__(location, None, 20, 20, None, None, None, None, False, None, None)
+        self.hits = 0
+
+    def show(self):
+        pass
+
+    def _touched(self, x, y):
+        self.hits += 1
+
+# Cost of passing a touch to the touchables under it, compared with testing
+# every touchable on the screen as was done before the index was added.
+def dispatch():
+    print('{:>10s}{:>8s}{:>8s}'.format('Touchables', 'Linear', 'Index'))
+    current = Screen.current_screen
+    for count in (10, 100, 500):
+        screen = Screen()
+        for n in range(count): # Tile the display
+            Pad(((n * 24) % 480, (n * 24 // 480 * 24) % 264))
+        times = []
+        for indexed in (False, True):
+            n = 1000
+            t = ticks_us()
+            while n:
+                x = (n * 37) % 480
+                y = (n * 53) % 272
+                if indexed:
+                    screen._dispatch(x, y)
+                else:
+                    for obj in screen.touchlist:
+                        if obj.visible and not obj.greyed_out():
+                            obj._trytouch(x, y)
+                n -= 1
+            times.append(ticks_diff(ticks_us(), t) // 1000)
+        print('{:>10d}{:>8d}{:>8d}  us per touch'.format(count, *times))
+    Screen.current_screen = current
+
+# Cost of filtering a touch sample for each filter mode and window length
+def touch_filter():
+    print('{:>10s}{:>8s}{:>8s}{:>8s}'.format('Confidence', 'MEAN', 'MEDIAN', 'IIR'))
+    for confidence in (5, 10, 25):
+        times = []
+        for mode in (MEAN, MEDIAN, IIR):
+            filt = TouchFilter(confidence, 2500, mode)
+            n = 1000
+            t = ticks_us()
+            while n:
+                filt.ready()
+                filt.add(2000 + (n & 7), 1000 - (n & 3))
+                n -= 1
+            times.append(ticks_diff(ticks_us(), t) // 1000)
+        print('{:>10d}{:>8d}{:>8d}{:>8d}  us per sample'.format(confidence, *times))
+
+# The touch sampling state machine driven by a simulated panel. The instance is
+# its own pen interrupt pin and ExtInt: press() changes the pin's level and
+# calls the ISR on a falling edge if the interrupt is enabled.
+class SimPanel(TouchSampler):
+    def __init__(self, pen_flag):
+        super().__init__()
+        self.filter = TouchFilter(5, 2500)
+        self.coeffs = fixed((0, 1, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0)) # Identity
+        self.delay = 10
+        self.pin_irq = self
+        self.extint = self
+        self.pen_flag = pen_flag
+        self.down = False
+        self.enabled = False
+        self.samples = 0
+
+    def value(self): # Pen interrupt line is low while touched
+        return 0 if self.down else 1
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def press(self, down):
+        falling = down and not self.down
+        self.down = down
+        if falling and self.enabled:
+            self._pen_down(None)
+
+    def raw_touch(self):
+        self.samples += 1
+        return (200, 100) if self.down else None
+
+class SimFlag(asyncio.Event): # A ThreadSafeFlag clears when waited on
+    async def wait(self):
+        await super().wait()
+        self.clear()
+
+# With the pen up there should be no samples, with it down one per delay ms.
+# A touch should be reported and the pen being lifted should set changed.
+async def touch_irq():
+    for flag in (SimFlag(), None):
+        panel = SimPanel(flag)
+        task = asyncio.create_task(panel._irq_thread())
+        counts = []
+        for down in (False, True, False):
+            panel.press(down)
+            panel.samples = 0
+            panel.changed.clear()
+            await asyncio.sleep_ms(100)
+            if down:
+                touch = panel.get_touch_async()
+            counts.append(panel.samples)
+        task.cancel()
+        released = panel.changed.is_set() and not panel.touched
+        print('Pen {}: samples per 100ms up {} down {} up {} touch {} released {}'.format(
+              'polled' if flag is None else 'interrupt', *counts, touch, released))
+        assert counts[0] == 0 and counts[2] <= 1 and 5 <= counts[1] <= 11, 'Wrong sample rate'
+        assert touch == (200, 100) and released, 'Touch not reported'
+
+# Accuracy and speed of the fixed point trig used by rotary widgets, compared
+# with the math module. The fixed point functions should not allocate.
+def trig_bench():
+    scale = 2 * math.pi / trig.TURN
+    err_sin = err_atan = 0
+    for a in range(0, trig.TURN, 61):
+        err_sin = max(err_sin, abs(trig.sin(a) / trig.ONE - math.sin(a * scale)))
+    for n in range(1000):
+        x = (n * 37) % 401 - 200
+        y = (n * 53) % 401 - 200
+        d = abs(trig.atan2(y, x) - math.atan2(y, x) / scale)
+        err_atan = max(err_atan, min(d, trig.TURN - d) * scale)
+    print('Max error: sin {:8.6f}  atan2 {:8.6f} radians'.format(err_sin, err_atan))
+    print('{:>10s}{:>8s}{:>8s}'.format('Function', 'math', 'trig'))
+    times = []
+    for fixed in (False, True):
+        n = 1000
+        t = ticks_us()
+        while n:
+            if fixed:
+                trig.endx(31457280, 1600, n * 61)
+            else:
+                int(120 + 100 * math.sin(n * 0.0058))
+            n -= 1
+        times.append(ticks_diff(ticks_us(), t))
+    print('{:>10s}{:>8d}{:>8d}  ns per call'.format('endpoint', *times))
+    times = []
+    for fixed in (False, True):
+        n = 1000
+        t = ticks_us()
+        while n:
+            if fixed:
+                trig.atan2(n - 500, 37)
+            else:
+                math.atan2(n - 500, 37)
+            n -= 1
+        times.append(ticks_diff(ticks_us(), t))
+    print('{:>10s}{:>8d}{:>8d}  ns per call'.format('atan2', *times))
+    gc.collect()
+    start = gc.mem_alloc()
+    n = 100
+    while n:
+        trig.endy(31457280, 1600, trig.atan2(n, -50))
+        n -= 1
+    used = gc.mem_alloc() - start
+    print('Fixed point trig allocation: {} bytes'.format(used))
+    assert used == 0, 'Fixed point trig allocated memory'
+
+# Open a dialog over the screen, change the Meter while it is covered and close
+# the dialog. The panel should then show what a full redraw would.
+async def round_trip(screen):
+    tft = Screen.tft
+    meter = [obj for obj in screen.displaylist if isinstance(obj, Meter)][0]
+    tft.clrSCR()
+    Screen.show()
+    for save_under in (False, True):
+        Screen.change(DialogBox, args = (font14,), kwargs = {'elements' : (('Yes', GREEN), ('No', RED)),
+                      'label' : 'Test', 'save_under' : save_under})
+        await asyncio.sleep_ms(50)
+        meter.value(0.9 if meter.value() < 0.5 else 0.1)
+        Screen.back()
+        await asyncio.sleep_ms(50)
+        img = bytes(TFT_sim.displayed())
+        tft.clrSCR()
+        Screen.show()
+        ref = TFT_sim.displayed()
+        bad = sum(1 for n in range(0, len(img), 3) if img[n : n + 3] != ref[n : n + 3])
+        print('Dialog round trip (save_under {}): {} pixels differ from a redraw'.format(save_under, bad))
+        assert bad == 0, 'Screen differs from a redraw after closing a dialog'
+
+# Bus activity of 20 taps on rows of a Listbox. Only the rows whose highlight
+# changes are drawn unless the displayed state is invalidated, which forces the
+# full repaint of every visible row made by earlier versions.
+async def listbox_taps():
+    Screen.change(ListScreen)
+    await asyncio.sleep_ms(50)
+    lb = Screen.current_screen.listbox
+    for full in (False, True):
+        TFT_sim.reset_stats()
+        for n in range(20):
+            if full:
+                lb.shown = None
+            lb._touched(10, (n * 7 % 12) * lb.entry_height + 5)
+            lb._untouched()
+        report('Listbox full' if full else 'Listbox x20', TFT_sim.stats())
+    Screen.back()
+    await asyncio.sleep_ms(50)
+
+# Worst case latency seen by a task while the screen is cleared
+async def latency():
+    tft = Screen.tft
+    done = False
+    worst = 0
+    async def probe():
+        nonlocal worst
+        t = ticks_us()
+        while not done:
+            await asyncio.sleep_ms(0)
+            now = ticks_us()
+            worst = max(worst, ticks_diff(now, t))
+            t = now
+    task = asyncio.create_task(probe())
+    await asyncio.sleep_ms(0) # Start the probe
+    tft.clrSCR()
+    await asyncio.sleep_ms(0)
+    blocking = worst
+    worst = 0
+    await tft.clr_scr_async()
+    await asyncio.sleep_ms(0)
+    done = True
+    await task
+    print('Clear screen latency: clrSCR {}us clr_scr_async {}us'.format(blocking, worst))
+
+async def main():
+    screen = BenchScreen()
+    print('{:14s}{:>9s}{:>9s}{:>9s}{:>7s}{:>7s}{:>9s}'.format('Object', 'WR', 'WR16', 'RD',
+          'setXY', 'reads', 'pixels'))
+    Screen.tft.clrSCR()
+    Screen.show() # First draw may initialise objects
+    Screen.tft.clrSCR()
+    for obj in screen.displaylist:
+        TFT_sim.reset_stats()
+        obj.redraw = True
+        obj.draw_border()
+        obj.show()
+        report(obj.__class__.__name__, TFT_sim.stats())
+    updates(screen)
+    shadow(screen)
+    TFT_sim.reset_stats()
+    for x in range(0, 480, 16): # Fan of lines of all slopes
+        Screen.tft.drawLine(240, 271, x, 0, WHITE)
+    for y in range(0, 272, 16):
+        Screen.tft.drawLine(240, 271, 0, y, WHITE)
+        Screen.tft.drawLine(240, 271, 479, y, WHITE)
+    report('Lines', TFT_sim.stats())
+    TFT_sim.reset_stats()
+    Screen.tft.clrSCR()
+    report('clrSCR', TFT_sim.stats())
+    circles()
+    allocation()
+    await round_trip(screen)
+    await listbox_taps()
+    await latency()
+    dispatch()
+    touch_filter()
+    await touch_irq()
+    trig_bench()
+    print('Garbage collection:', Screen.gc_stats())
+    Screen.show()
+    TFT_sim.snapshot('simbench.png')
+
+def test():
+    print('Rendering cost on simulated display')
+    Screen.setup(TFT_G("SSD1963", "LB04301", LANDSCAPE), None)
+    try:
+        asyncio.run(main())
+    finally:
+        asyncio.new_event_loop()
+
+test()
@@ -144,6 +144,71 @@ def displaySCR_charbitmap(bits: ptr8, size: int, control: ptr8, bg_buf: ptr8):
         size -= 1
         bg_ptr += 3
 #
+# Copy a character bitmap of rows x cols into a 1 bit per pixel string bitmap
+# dwidth pixels wide, with its left edge at column xpos. The character cell is
+# cell pixels wide: columns beyond the character are cleared.
+#
+@micropython.viper
+def blit_charbitmap(dest: ptr8, dwidth: int, xpos: int, bits: ptr8, rows: int, cols: int, cell: int):
+    stride = (cols + 7) >> 3
+    if cols > cell:
+        cols = cell
+    row = 0
+    while row < rows:
+        bm_ptr = row * stride
+        dbit = row * dwidth + xpos
+        col = 0
+        while col < cell:
+            dmask = 0x80 >> (dbit & 7)
+            if col < cols and (bits[bm_ptr + (col >> 3)] & (0x80 >> (col & 7))):
+                dest[dbit >> 3] = dest[dbit >> 3] | dmask
+            else:
+                dest[dbit >> 3] = dest[dbit >> 3] & (0xff ^ dmask)
+            dbit += 1
+            col += 1
+        row += 1
+#
+# Render a character bitmap into dest as displaySCR_charbitmap would display it,
+# 3 bytes per pixel. If the transparency mode uses the background, dest must
+# hold it on entry. Used by the shadow framebuffer to mirror text.
+#
+@micropython.viper
+def render_charbitmap(dest: ptr8, bits: ptr8, size: int, control: ptr8):
+    transparency = control[6]
+    bm_ptr = 0
+    ptr = 0
+    mask = 0x80
+    while size:
+        if bits[bm_ptr] & mask:
+            if transparency & 8: # Invert bg color as foreground
+                dest[ptr] = 255 - dest[ptr]
+                dest[ptr + 1] = 255 - dest[ptr + 1]
+                dest[ptr + 2] = 255 - dest[ptr + 2]
+            else:
+                dest[ptr] = control[3]
+                dest[ptr + 1] = control[4]
+                dest[ptr + 2] = control[5]
+        elif transparency & 1: # Dim background
+            dest[ptr] = dest[ptr] >> 1
+            dest[ptr + 1] = dest[ptr + 1] >> 1
+            dest[ptr + 2] = dest[ptr + 2] >> 1
+        elif transparency & 2: # Keep background
+            pass
+        elif transparency & 4: # Invert background
+            dest[ptr] = 255 - dest[ptr]
+            dest[ptr + 1] = 255 - dest[ptr + 1]
+            dest[ptr + 2] = 255 - dest[ptr + 2]
+        else: # Not transparent
+            dest[ptr] = control[0]
+            dest[ptr + 1] = control[1]
+            dest[ptr + 2] = control[2]
+        mask >>= 1
+        if mask == 0:
+            mask = 0x80
+            bm_ptr += 1
+        size -= 1
+        ptr += 3
+#
 # display Windows BMP data, optionally with colortables
 #
 @micropython.viper        
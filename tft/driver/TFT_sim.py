@@ -0,0 +1,413 @@
+# TFT_sim.py Simulated low level I/O for the TFT driver
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2020 Peter Hinch
+
+# Pure Python replacement for TFT_io.py for use where the Pyboard hardware is
+# absent, for example the Unix build of MicroPython. It presents the same
+# functions as TFT_io. Commands and data are decoded as the SSD1963 would decode
+# them and written to an in-memory framebuffer. Bus activity is counted so that
+# the cost of rendering can be measured: see stats() and reset_stats().
+# tft.py imports this module automatically if the pyb module is unavailable.
+
+try:
+    from uctypes import bytearray_at
+except ImportError:
+    bytearray_at = None
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+PORTRAIT = 1
+LANDSCAPE = 0
+
+class _Panel:
+    def __init__(self):
+        self.madctl = 0
+        self.bpp = 3 # Bytes per pixel on the bus
+        self.size(480, 272)
+        self.reset_stats()
+
+    def size(self, width, height): # Physical dimensions
+        self.width = width
+        self.height = height
+        self.fb = bytearray(width * height * 3) # RGB, 3 bytes per pixel
+        self.xs = self.ys = 0
+        self.xe = width - 1
+        self.ye = height - 1
+        self.cmd = 0
+        self.params = bytearray()
+        self.cursor(True)
+        self.tfa = 0 # Vertical scroll area
+        self.vsa = height
+        self.vsp = 0 # Memory line shown at the top of the scroll area
+
+    def reset_stats(self):
+        self.wr = 0 # WR strobes
+        self.rd = 0 # RD strobes
+        self.setxy = 0 # Window commands
+        self.reads = 0 # Read-back transactions
+        self.pixels = 0 # Pixels written
+
+    def cursor(self, start):
+        if start:
+            self.cx = self.xs
+            self.cy = self.ys
+        self.acc = bytearray() # Partial pixel
+
+    def command(self, cmd):
+        self.wr += 1
+        self.cmd = cmd
+        self.params = bytearray()
+        if cmd == 0x2c or cmd == 0x2e:
+            self.cursor(True)
+        elif cmd == 0x3c:
+            self.cursor(False)
+
+    def data(self, b):
+        self.wr += 1
+        cmd = self.cmd
+        if cmd == 0x2c or cmd == 0x3c: # Memory write
+            acc = self.acc
+            acc.append(b)
+            if len(acc) == self.bpp:
+                self.put(acc, 1)
+                self.acc = bytearray()
+            return
+        params = self.params
+        params.append(b)
+        n = len(params)
+        if cmd == 0x2a and n == 4:
+            self.xs = params[0] << 8 | params[1]
+            self.xe = params[2] << 8 | params[3]
+        elif cmd == 0x2b and n == 4:
+            self.ys = params[0] << 8 | params[1]
+            self.ye = params[2] << 8 | params[3]
+        elif cmd == 0x36:
+            self.madctl = params[0]
+        elif cmd == 0x33 and n == 6:
+            self.tfa = params[0] << 8 | params[1]
+            self.vsa = params[2] << 8 | params[3]
+        elif cmd == 0x37 and n == 2:
+            self.vsp = params[0] << 8 | params[1]
+        elif cmd == 0xb0 and n == 6:
+            self.size((params[2] << 8 | params[3]) + 1, (params[4] << 8 | params[5]) + 1)
+
+    def line(self, y): # Memory line shown on physical line y
+        tfa = self.tfa
+        if tfa <= y < tfa + self.vsa:
+            return tfa + (y - tfa + self.vsp - tfa) % self.vsa
+        return y
+
+    def _advance(self, run): # Step cursor by run pixels. Wraps at end of window.
+        if self.madctl & 0x20: # Row/column exchange: page address increments first
+            self.cy += run
+            if self.cy > self.ye:
+                self.cy = self.ys
+                self.cx += 1
+                if self.cx > self.xe:
+                    self.cx = self.xs
+        else:
+            self.cx += run
+            if self.cx > self.xe:
+                self.cx = self.xs
+                self.cy += 1
+                if self.cy > self.ye:
+                    self.cy = self.ys
+
+    def _run(self, n): # Pixels remaining on current line of window
+        if self.madctl & 0x20:
+            return min(n, self.ye - self.cy + 1)
+        return min(n, self.xe - self.cx + 1)
+
+    # Write n pixels. buf holds 3 bytes (R, G, B) per pixel, or a single pixel
+    # which is repeated if fill is True.
+    def put(self, buf, n, fill=False):
+        self.pixels += n
+        fb = self.fb
+        w = self.width
+        h = self.height
+        mv = self.madctl & 0x20
+        idx = 0
+        while n > 0:
+            run = max(self._run(n), 1)
+            cx, cy = self.cx, self.cy
+            if mv:
+                if 0 <= cx < w:
+                    for k in range(run):
+                        if 0 <= cy + k < h:
+                            off = ((cy + k) * w + cx) * 3
+                            src = 0 if fill else (idx + k) * 3
+                            fb[off : off + 3] = buf[src : src + 3]
+            elif 0 <= cy < h:
+                x0 = max(cx, 0)
+                x1 = min(cx + run, w)
+                if x1 > x0:
+                    off = (cy * w + x0) * 3
+                    if fill:
+                        fb[off : off + (x1 - x0) * 3] = bytes(buf[0 : 3]) * (x1 - x0)
+                    else:
+                        src = (idx + x0 - cx) * 3
+                        fb[off : off + (x1 - x0) * 3] = buf[src : src + (x1 - x0) * 3]
+            idx += run
+            n -= run
+            self._advance(run)
+
+    def get(self, n): # Read n pixels from the cursor position
+        out = bytearray(n * 3)
+        fb = self.fb
+        w = self.width
+        h = self.height
+        for i in range(n):
+            cx, cy = self.cx, self.cy
+            if 0 <= cx < w and 0 <= cy < h:
+                off = (cy * w + cx) * 3
+                out[i * 3 : i * 3 + 3] = fb[off : off + 3]
+            self._advance(1)
+        return out
+
+    def window(self, cmd_x, cmd_y, x1, y1, x2, y2):
+        self.setxy += 1
+        for cmd, a, b in ((cmd_x, x1, x2), (cmd_y, y1, y2)):
+            a = int(a)
+            b = int(b)
+            self.command(cmd)
+            self.data((a >> 8) & 0xff)
+            self.data(a & 0xff)
+            self.data((b >> 8) & 0xff)
+            self.data(b & 0xff)
+        self.command(0x2c)
+
+_p = _Panel()
+
+# Arguments which TFT_io receives as pointers may be buffers or addresses
+def _buf(p, size):
+    if isinstance(p, int):
+        return bytearray_at(p, size)
+    return p
+
+# *********** TFT_io INTERFACE ***********
+
+def displaySCR_charbitmap(bits, size, control, bg_buf):
+    out = bytearray(size * 3)
+    if control[6]:
+        out[:] = bg_buf[0 : size * 3]
+    render_charbitmap(out, bits, size, control)
+    _p.wr += size * 3
+    _p.put(out, size)
+
+def render_charbitmap(dest, bits, size, control):
+    bits = _buf(bits, (size + 7) // 8)
+    transparency = control[6]
+    fg = bytes(control[3 : 6])
+    bg = bytes(control[0 : 3])
+    for i in range(size):
+        o = i * 3
+        if bits[i >> 3] & (0x80 >> (i & 7)):
+            if transparency & 8: # Invert bg color as foreground
+                for k in range(3):
+                    dest[o + k] = 255 - dest[o + k]
+            else:
+                dest[o : o + 3] = fg
+        elif transparency & 1: # Dim background
+            for k in range(3):
+                dest[o + k] = dest[o + k] >> 1
+        elif transparency & 2: # Keep background
+            pass
+        elif transparency & 4: # Invert background
+            for k in range(3):
+                dest[o + k] = 255 - dest[o + k]
+        else:
+            dest[o : o + 3] = bg
+
+def blit_charbitmap(dest, dwidth, xpos, bits, rows, cols, cell):
+    stride = (cols + 7) >> 3
+    bits = _buf(bits, stride * rows)
+    cols = min(cols, cell)
+    for row in range(rows):
+        bm_ptr = row * stride
+        dbit = row * dwidth + xpos
+        for col in range(cell):
+            dmask = 0x80 >> (dbit & 7)
+            if col < cols and bits[bm_ptr + (col >> 3)] & (0x80 >> (col & 7)):
+                dest[dbit >> 3] |= dmask
+            else:
+                dest[dbit >> 3] &= 0xff ^ dmask
+            dbit += 1
+
+def displaySCR_bmp(data, size, bits, colortable):
+    data = _buf(data, (size * bits + 7) // 8)
+    colortable = _buf(colortable, 4 << bits)
+    out = bytearray(size * 3)
+    mask = (1 << bits) - 1
+    for i in range(size):
+        bit = i * bits
+        offset = ((data[bit >> 3] >> (8 - bits - (bit & 7))) & mask) * 4
+        out[i * 3] = colortable[offset + 2] # Red
+        out[i * 3 + 1] = colortable[offset + 1]
+        out[i * 3 + 2] = colortable[offset]
+    _p.wr += size * 3
+    _p.put(out, size)
+
+def setXY_L(x1, y1, x2, y2):
+    _p.window(0x2a, 0x2b, x1, y1, x2, y2)
+
+def setXY_P(x1, y1, x2, y2):
+    _p.window(0x2b, 0x2a, x1, y1, x2, y2)
+
+def drawPixel_L(x, y, colorvect):
+    setXY_L(x, y, x, y)
+    fillSCR_AS(colorvect, 1)
+
+def drawPixel_P(x, y, colorvect):
+    setXY_P(x, y, x, y)
+    fillSCR_AS(colorvect, 1)
+
+def fillSCR_AS(data, size):
+    if size > 0:
+        _p.wr += size * 3
+        _p.put(data, size, True)
+
+def displaySCR_AS(data, size): # Data is blue-green-red
+    data = _buf(data, size * 3)
+    out = bytearray(size * 3)
+    for i in range(0, size * 3, 3):
+        out[i] = data[i + 2]
+        out[i + 1] = data[i + 1]
+        out[i + 2] = data[i]
+    _p.wr += size * 3
+    _p.put(out, size)
+
+def displaySCR565_AS(data, size): # Little-endian RGB565
+    data = _buf(data, size * 2)
+    out = bytearray(size * 3)
+    for i in range(size):
+        lo = data[2 * i]
+        hi = data[2 * i + 1]
+        out[3 * i] = hi & 0xf8
+        out[3 * i + 1] = ((hi << 5) | (lo >> 3)) & 0xfc
+        out[3 * i + 2] = (lo << 3) & 0xff
+    _p.wr += size * 3
+    _p.put(out, size)
+
+def tft_cmd_data(cmd, data, size):
+    _p.command(cmd)
+    for i in range(size):
+        _p.data(data[i])
+
+tft_cmd_data_AS = tft_cmd_data
+
+def tft_cmd(cmd):
+    _p.command(cmd)
+
+def tft_write_data_AS(data, size):
+    if _p.cmd in (0x2c, 0x3c) and not _p.acc and size % 3 == 0:
+        _p.wr += size
+        _p.put(data, size // 3)
+    else:
+        for i in range(size):
+            _p.data(data[i])
+
+def tft_read_cmd_data_AS(cmd, data, size):
+    _p.command(cmd)
+    _p.reads += 1
+    _p.rd += size
+    if cmd == 0x2e: # Memory read
+        data[0 : size] = _p.get(size // 3)[0 : size]
+
+def swapbytes(data, size):
+    for i in range(0, size - 1, 2):
+        data[i], data[i + 1] = data[i + 1], data[i]
+
+def swapcolors(data, size):
+    for i in range(0, size - 2, 3):
+        data[i], data[i + 2] = data[i + 2], data[i]
+
+# *********** SIMULATION INTERFACE ***********
+
+# Bus activity since the last reset_stats()
+def stats():
+    return {'wr' : _p.wr, 'rd' : _p.rd, 'setxy' : _p.setxy, 'reads' : _p.reads, 'pixels' : _p.pixels}
+
+def reset_stats():
+    _p.reset_stats()
+
+# Return the (r, g, b) color of a pixel of display memory in physical
+# (landscape) coordinates
+def pixel(x, y):
+    off = (y * _p.width + x) * 3
+    return tuple(_p.fb[off : off + 3])
+
+def framebuffer():
+    return _p.fb, _p.width, _p.height
+
+# Return the image seen on the panel: display memory with the vertical scroll
+# applied.
+def displayed():
+    fb, w = _p.fb, _p.width
+    nbytes = w * 3
+    img = bytearray()
+    for y in range(_p.height):
+        off = _p.line(y) * nbytes
+        img += fb[off : off + nbytes]
+    return img
+
+# Write the displayed image to a PNG file. The image is uncompressed. In portrait
+# mode it is transposed to match the orientation of the display.
+def snapshot(filename):
+    fb, w, h = displayed(), _p.width, _p.height
+    portrait = _p.madctl & 0x20
+    if portrait:
+        w, h = h, w
+    raw = bytearray()
+    for y in range(h):
+        raw.append(0) # Filter type: none
+        if portrait:
+            for x in range(w):
+                off = (x * h + y) * 3
+                raw += fb[off : off + 3]
+        else:
+            raw += fb[y * w * 3 : (y + 1) * w * 3]
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        _chunk(f, b'IHDR', w.to_bytes(4, 'big') + h.to_bytes(4, 'big') + b'\x08\x02\x00\x00\x00')
+        _chunk(f, b'IDAT', _zlib_store(raw))
+        _chunk(f, b'IEND', b'')
+
+def _crc(data, crc=0):
+    if crc32 is not None:
+        return crc32(data, crc) & 0xffffffff
+    crc ^= 0xffffffff
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0xedb88320 if crc & 1 else 0)
+    return crc ^ 0xffffffff
+
+def _chunk(f, tag, data):
+    f.write(len(data).to_bytes(4, 'big'))
+    f.write(tag)
+    f.write(data)
+    f.write(_crc(data, _crc(tag)).to_bytes(4, 'big'))
+
+# zlib stream of stored (uncompressed) deflate blocks
+def _zlib_store(data):
+    out = bytearray(b'\x78\x01')
+    n = len(data)
+    pos = 0
+    while True:
+        blk = min(n - pos, 0xffff)
+        final = pos + blk >= n
+        out.append(1 if final else 0)
+        out += blk.to_bytes(2, 'little') + (blk ^ 0xffff).to_bytes(2, 'little')
+        out += data[pos : pos + blk]
+        pos += blk
+        if final:
+            break
+    a, b = 1, 0
+    for c in data:
+        a = (a + c) % 65521
+        b = (b + a) % 65521
+    out += ((b << 16) | a).to_bytes(4, 'big')
+    return out
@@ -0,0 +1,106 @@
+# glyphcache.py Cache of rendered glyphs for the TFT driver.
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Opaque text is normally expanded from the font's 1 bit per pixel bitmap as it
+# is sent to the display. A GlyphCache holds glyphs already expanded to the 3
+# bytes per pixel sent on the bus, so that printing one is a raw write. Glyphs
+# are held in a dict per font, colors and gap, keyed by character code.
+# Readouts use few glyphs in few colors, so a small cache serves most of their
+# text. Each glyph records when it was last used: a hit is a dict lookup and
+# allocates nothing. When the budget of bytes is exceeded the least recently
+# used glyphs are found by a scan and discarded.
+
+from micropython import const
+from uctypes import addressof
+
+_MAXCLOCK = const(0x20000000) # Use counts are halved beyond this
+
+class GlyphCache:
+    def __init__(self, io, budget):
+        self.io = io
+        self.budget = budget
+        self.used = 0 # Bytes held
+        self.sets = {} # (font, color, gap): {char code: [raster, last use]}
+        self.font = None # Parameters of the current set
+        self.color = None
+        self.gap = None
+        self.glyphs = None # Current set
+        self.clock = 0 # Use count
+        self.bits = bytearray()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        n = 0
+        for glyphs in self.sets.values():
+            n += len(glyphs)
+        return {'glyphs' : n, 'bytes' : self.used, 'hits' : self.hits, 'misses' : self.misses}
+
+# Return the raster of a glyph cols + gap pixels wide, or None if it exceeds the
+# budget. color holds the background and foreground colors as in
+# TFT.text_color.
+    def get(self, font, char, color, gap):
+        if font is not self.font or gap != self.gap or color != self.color:
+            self._select(font, color, gap)
+        self.clock += 1
+        if self.clock >= _MAXCLOCK:
+            self._age()
+        entry = self.glyphs.get(ord(char))
+        if entry is not None:
+            self.hits += 1
+            entry[1] = self.clock
+            return entry[0]
+        raster = self._render(font, char, color, gap)
+        if raster is None:
+            return None
+        self.misses += 1
+        self.used += len(raster)
+        self.glyphs[ord(char)] = [raster, self.clock]
+        while self.used > self.budget:
+            self._evict()
+        return raster
+
+    def _select(self, font, color, gap):
+        key = (font, color, gap)
+        glyphs = self.sets.get(key)
+        if glyphs is None:
+            glyphs = {}
+            self.sets[key] = glyphs
+        self.glyphs = glyphs
+        self.font = font
+        self.color = color
+        self.gap = gap
+
+    def _evict(self): # Discard the least recently used glyph
+        oldest = self.clock + 1
+        for key, glyphs in self.sets.items():
+            for code, entry in glyphs.items():
+                if entry[1] < oldest:
+                    oldest = entry[1]
+                    okey, ocode = key, code
+        glyphs = self.sets[okey]
+        self.used -= len(glyphs.pop(ocode)[0])
+        if not glyphs and glyphs is not self.glyphs:
+            del self.sets[okey]
+
+    def _age(self): # Keep use counts small ints, preserving their order
+        self.clock >>= 1
+        for glyphs in self.sets.values():
+            for entry in glyphs.values():
+                entry[1] >>= 1
+
+    def _render(self, font, char, color, gap):
+        fmv, rows, cols = font.get_ch(char)
+        cell = cols + gap
+        nbytes = cell * rows * 3
+        if nbytes > self.budget:
+            return None
+        pix_count = cell * rows
+        if len(self.bits) < (pix_count + 7) // 8:
+            self.bits = bytearray((pix_count + 7) // 8)
+        self.io.blit_charbitmap(self.bits, cell, 0, addressof(fmv), rows, cols, cell)
+        raster = bytearray(nbytes)
+        self.io.render_charbitmap(raster, self.bits, pix_count, color + b'\x00') # Opaque
+        return raster
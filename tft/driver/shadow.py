@@ -0,0 +1,301 @@
+# shadow.py Shadow framebuffer for the TFT driver.
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Reading pixels back from the display over the 8 bit bus is slow. A Shadow
+# holds copies of areas of display memory so that reads are served from RAM.
+# It wraps the TFT_io module and presents the same functions: writes go to the
+# display and are mirrored in RAM.
+# Display memory is divided into tiles of 32x32 pixels. A tile is loaded from
+# the display when a read first covers it and stays resident. Once all tiles are
+# in use, reads which need further tiles are passed to the display: replacing
+# tiles would read more than it saves. If there are enough tiles to cover the
+# screen a solid fill which covers a tile loads it without a read, so after the
+# screen is cleared no reads reach the display. Pixels are held as read (3
+# bytes) so that restored areas are exact.
+# Solid fills, raw data and text are mirrored. Bitmaps, and writes to windows
+# not wholly on screen, discard the tiles they touch.
+
+from micropython import const
+
+_TILE_BITS = const(5)
+_TILE = const(32)  # Tile side in pixels
+_ROW_BYTES = const(96)  # Bytes per row of a tile
+_TILE_BYTES = const(3072)
+
+_FILL = const(0)
+_WRITE = const(1)
+_READ = const(2)
+_DISCARD = const(3)
+
+class Shadow:
+    def __init__(self, io, width, height, tiles, portrait=False):
+        for name in dir(io):  # Functions not overridden are called directly
+            if not name.startswith('_') and not hasattr(self, name):
+                setattr(self, name, getattr(io, name))
+        self.io = io
+        self.width = width
+        self.height = height
+        self.setxy = io.setXY_P if portrait else io.setXY_L
+        self.cols = (width + _TILE - 1) >> _TILE_BITS
+        total = self.cols * ((height + _TILE - 1) >> _TILE_BITS)
+        self.ntiles = min(tiles, total)
+        self.full = self.ntiles == total  # Covers the screen
+        self.free = [memoryview(bytearray(_TILE_BYTES)) for _ in range(self.ntiles)]
+        self.tiles = {}  # Resident tiles keyed by index
+        self.fillrow = memoryview(bytearray(_ROW_BYTES))  # A row of the last fill color
+        self.fillvect = None
+        self.scratch = bytearray(_TILE_BYTES)
+        self.loads = 0  # Tiles read from the display
+        self._window(0, 0, -1, -1)
+
+    def memory(self):  # Bytes allocated to tiles
+        return self.ntiles * _TILE_BYTES
+
+    def discard(self):  # Forget all tiles, e.g. if the display is written directly
+        self.free.extend(self.tiles.values())
+        self.tiles.clear()
+
+    def _window(self, x1, y1, x2, y2):
+        self.wx0 = x1
+        self.wy0 = y1
+        self.wx1 = x2
+        self.wy1 = y2
+        self.ww = x2 - x1 + 1
+        self.wn = self.ww * (y2 - y1 + 1)  # Pixels in window
+        self.cursor = 0  # Pixels transferred since window was set
+        self.valid = 0 <= x1 <= x2 < self.width and 0 <= y1 <= y2 < self.height
+
+# *********** TFT_io INTERFACE ***********
+
+    def setXY_L(self, x1, y1, x2, y2):
+        self._window(x1, y1, x2, y2)
+        self.setxy(x1, y1, x2, y2)
+
+    setXY_P = setXY_L
+
+    def drawPixel_L(self, x, y, colorvect):
+        self._window(x, y, x, y)
+        self._span(_FILL, colorvect, 1)
+        self.io.drawPixel_L(x, y, colorvect)
+
+    def drawPixel_P(self, x, y, colorvect):
+        self._window(x, y, x, y)
+        self._span(_FILL, colorvect, 1)
+        self.io.drawPixel_P(x, y, colorvect)
+
+    def fillSCR_AS(self, data, size):
+        self._span(_FILL, data, size)
+        self.io.fillSCR_AS(data, size)
+
+    def tft_write_data_AS(self, data, size):
+        if size % 3:
+            self._span(_DISCARD, data, (size + 2) // 3)
+        else:
+            self._span(_WRITE, data, size // 3)
+        self.io.tft_write_data_AS(data, size)
+
+    def displaySCR_AS(self, data, size):  # Blue-green-red
+        self._span(_DISCARD, data, size)
+        self.io.displaySCR_AS(data, size)
+
+    def displaySCR565_AS(self, data, size):
+        self._span(_DISCARD, data, size)
+        self.io.displaySCR565_AS(data, size)
+
+    def displaySCR_bmp(self, data, size, bits, colortable):
+        self._span(_DISCARD, data, size)
+        self.io.displaySCR_bmp(data, size, bits, colortable)
+
+    # If the text lies on a resident tile it is rendered here and written raw.
+    def displaySCR_charbitmap(self, bits, size, control, bg_buf):
+        nbytes = size * 3
+        if not self._resident():
+            self._span(_DISCARD, bits, size)
+            self.io.displaySCR_charbitmap(bits, size, control, bg_buf)
+            return
+        if nbytes > len(self.scratch):
+            self.scratch = bytearray(nbytes)
+        buf = self.scratch
+        if control[6]:
+            buf[0 : nbytes] = memoryview(bg_buf)[0 : nbytes]
+        self.io.render_charbitmap(buf, bits, size, control)
+        self.tft_write_data_AS(buf, nbytes)
+
+    def tft_cmd(self, cmd):
+        self._window(0, 0, -1, -1)
+        self.io.tft_cmd(cmd)
+
+    def tft_cmd_data(self, cmd, data, size):
+        self._command(cmd)
+        self.io.tft_cmd_data(cmd, data, size)
+
+    def tft_cmd_data_AS(self, cmd, data, size):
+        self._command(cmd)
+        self.io.tft_cmd_data_AS(cmd, data, size)
+
+    def tft_read_cmd_data_AS(self, cmd, data, size):
+        if cmd == 0x2e and self.ntiles and size % 3 == 0:
+            n = size // 3
+            self.cursor = 0
+            if self.valid and n <= self.wn and self._load():
+                self._span(_READ, data, n)
+                return
+        else:
+            self._command(cmd)
+        self.io.tft_read_cmd_data_AS(cmd, data, size)
+
+# *********** SHADOW ***********
+
+    def _command(self, cmd):
+        self._window(0, 0, -1, -1)  # Memory access needs a new window
+        if cmd == 0x36:  # Orientation has changed
+            self.discard()
+
+    def _resident(self):  # True if a tile under the window is resident
+        if not (self.tiles and self.valid):
+            return False
+        tiles = self.tiles
+        cols = self.cols
+        for ty in range(self.wy0 >> _TILE_BITS, (self.wy1 >> _TILE_BITS) + 1):
+            for tx in range(self.wx0 >> _TILE_BITS, (self.wx1 >> _TILE_BITS) + 1):
+                if ty * cols + tx in tiles:
+                    return True
+        return False
+
+    # True if tile tx, ty may be loaded from a fill of the rectangle
+    def _covers(self, tx, ty, x0, y0, x1, y1):
+        tx0 = tx << _TILE_BITS
+        ty0 = ty << _TILE_BITS
+        return (self.full and self.free and x0 <= tx0 and y0 <= ty0
+                and x1 >= min(tx0 + _TILE, self.width) - 1
+                and y1 >= min(ty0 + _TILE, self.height) - 1)
+
+    # Ensure all tiles under the window are resident. Fails if there are not
+    # enough free tiles.
+    def _load(self):
+        tx0 = self.wx0 >> _TILE_BITS
+        tx1 = self.wx1 >> _TILE_BITS
+        ty0 = self.wy0 >> _TILE_BITS
+        ty1 = self.wy1 >> _TILE_BITS
+        tiles = self.tiles
+        cols = self.cols
+        missing = 0
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                if ty * cols + tx not in tiles:
+                    missing += 1
+        if missing > len(self.free):
+            return False
+        if missing:
+            for ty in range(ty0, ty1 + 1):
+                for tx in range(tx0, tx1 + 1):
+                    if ty * cols + tx not in tiles:
+                        tiles[ty * cols + tx] = self._fetch(tx, ty)
+        return True
+
+    def _fetch(self, tx, ty):  # Read a tile from the display
+        buf = self.free.pop()
+        x0 = tx << _TILE_BITS
+        y0 = ty << _TILE_BITS
+        w = min(_TILE, self.width - x0)
+        h = min(_TILE, self.height - y0)
+        self.setxy(x0, y0, x0 + w - 1, y0 + h - 1)
+        if w == _TILE:
+            self.io.tft_read_cmd_data_AS(0x2e, buf, w * h * 3)
+        else:  # Tile at right edge of screen
+            scratch = memoryview(self.scratch)
+            self.io.tft_read_cmd_data_AS(0x2e, scratch, w * h * 3)
+            nbytes = w * 3
+            for row in range(h):
+                buf[row * _ROW_BYTES : row * _ROW_BYTES + nbytes] = scratch[row * nbytes : (row + 1) * nbytes]
+        self.loads += 1
+        return buf
+
+    # Transfer the next n pixels of the window between data and resident tiles.
+    # The range is split into up to three rectangles: a partial first row, whole
+    # rows and a partial last row.
+    def _span(self, op, data, n):
+        c = self.cursor
+        self.cursor = c + n
+        if n <= 0 or not (self.tiles or self.full and op == _FILL and self.free):
+            return
+        if not self.valid or c + n > self.wn:  # Off screen or wraps
+            x0 = max(self.wx0, 0)
+            y0 = max(self.wy0, 0)
+            x1 = min(self.wx1, self.width - 1)
+            y1 = min(self.wy1, self.height - 1)
+            if x1 >= x0 and y1 >= y0:
+                self._rect(_DISCARD, None, x0, y0, x1, y1, 0)
+            return
+        if op == _FILL:
+            if data is not self.fillvect:
+                row = self.fillrow
+                for i in range(0, _ROW_BYTES, 3):
+                    row[i : i + 3] = data[0 : 3]
+                self.fillvect = data
+        elif op != _DISCARD:
+            data = memoryview(data)
+        ww = self.ww
+        x0 = self.wx0
+        x1 = self.wx1
+        r0, c0 = divmod(c, ww)
+        r1, c1 = divmod(c + n - 1, ww)
+        r0 += self.wy0
+        r1 += self.wy0
+        if r0 == r1:
+            self._rect(op, data, x0 + c0, r0, x0 + c1, r0, c)
+            return
+        if c0:
+            self._rect(op, data, x0 + c0, r0, x1, r0, c)
+            r0 += 1
+        if c1 < ww - 1:
+            self._rect(op, data, x0, r1, x0 + c1, r1, c)
+            r1 -= 1
+        if r1 >= r0:
+            self._rect(op, data, x0, r0, x1, r1, c)
+
+    # Apply op to the rectangle x0, y0, x1, y1 (inclusive) of the window. c is
+    # the window pixel held at the start of data.
+    def _rect(self, op, data, x0, y0, x1, y1, c):
+        tiles = self.tiles
+        cols = self.cols
+        stride = self.ww * 3
+        for ty in range(y0 >> _TILE_BITS, (y1 >> _TILE_BITS) + 1):
+            ty0 = ty << _TILE_BITS
+            ya = max(y0, ty0)
+            yb = min(y1, ty0 + _TILE - 1)
+            for tx in range(x0 >> _TILE_BITS, (x1 >> _TILE_BITS) + 1):
+                key = ty * cols + tx
+                tile = tiles.get(key)
+                if tile is None:
+                    if op != _FILL or not self._covers(tx, ty, x0, y0, x1, y1):
+                        continue
+                    tile = self.free.pop()  # Contents are known: no need to read
+                    tiles[key] = tile
+                if op == _DISCARD:
+                    del tiles[key]
+                    self.free.append(tile)
+                    continue
+                tx0 = tx << _TILE_BITS
+                xa = max(x0, tx0)
+                nbytes = (min(x1, tx0 + _TILE - 1) - xa + 1) * 3
+                t = (ya - ty0) * _ROW_BYTES + (xa - tx0) * 3
+                if op == _FILL:
+                    src = self.fillrow[0 : nbytes]
+                    for _ in range(yb - ya + 1):
+                        tile[t : t + nbytes] = src
+                        t += _ROW_BYTES
+                    continue
+                s = ((ya - self.wy0) * self.ww + xa - self.wx0 - c) * 3
+                if op == _WRITE:
+                    for _ in range(yb - ya + 1):
+                        tile[t : t + nbytes] = data[s : s + nbytes]
+                        t += _ROW_BYTES
+                        s += stride
+                else:
+                    for _ in range(yb - ya + 1):
+                        data[s : s + nbytes] = tile[t : t + nbytes]
+                        t += _ROW_BYTES
+                        s += stride
@@ -0,0 +1,203 @@
+# sprite.py Save-under sprites for the TFT driver.
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# A sprite is a solid colored shape drawn over existing screen content such as
+# the slide of a slider or the pointer of a dial. Before it is drawn the pixels
+# under it are read back from the display. When it is hidden or moved they are
+# written back, so anything underneath (tick marks, other pointers) survives.
+# The shape is a list of rectangles, stored as an array of inclusive coordinates
+# x0, y0, x1, y1. A RectSprite has one rectangle, a LineSprite one per
+# horizontal or vertical run of its line.
+# Sprites which overlap must be hidden in the reverse order of being shown.
+# If the background under a sprite is about to be repainted (a redraw of the
+# control) its saved pixels are stale: erase() blanks it and discards them. If
+# the background has already been repainted discard() just drops them.
+
+from array import array
+
+class Sprite:
+    def __init__(self, pixels, nrects):
+        self.buf = bytearray(3 * pixels) # Pixels under the sprite, 3 bytes each
+        self.mv = memoryview(self.buf)
+        self.rects = array('h', bytes(8 * nrects))
+        self.nrects = 0 # No position yet
+        self.color = None
+        self.shown = False
+
+    def hide(self, tft): # Restore the pixels under the sprite
+        if self.shown:
+            self._transfer(tft, False)
+            self.shown = False
+
+    def erase(self, tft, color): # Fill with color and discard the saved pixels
+        if self.shown:
+            r = self.rects
+            for i in range(0, 4 * self.nrects, 4):
+                tft.fill_rectangle(r[i], r[i + 1], r[i + 2], r[i + 3], color)
+            self.shown = False
+
+    def discard(self): # Sprite is no longer on the display
+        self.shown = False
+
+    def show(self, tft): # Save the pixels under the sprite and draw it
+        if self.nrects and not self.shown:
+            self._transfer(tft, True)
+            self._draw(tft)
+            self.shown = True
+
+    def _transfer(self, tft, save):
+        r = self.rects
+        mv = self.mv
+        offs = 0
+        for i in range(0, 4 * self.nrects, 4):
+            if save:
+                tft.readArea(r[i], r[i + 1], r[i + 2], r[i + 3], mv[offs:])
+            else:
+                tft.writeArea(r[i], r[i + 1], r[i + 2], r[i + 3], mv[offs:])
+            offs += (r[i + 2] - r[i] + 1) * (r[i + 3] - r[i + 1] + 1) * 3
+
+# A filled rectangle of fixed size. If a move overlaps the old position the
+# restore and redraw are composed in memory and written in a single window.
+class RectSprite(Sprite):
+    def __init__(self, width, height):
+        super().__init__(width * height, 1)
+        self.width = width
+        self.height = height
+        self.work = bytearray(6 * width * height) # Union of old and new positions
+        self.wmv = memoryview(self.work)
+        self.row = None # One row of the sprite's color
+        self.rowvect = None
+
+    def move(self, tft, x, y, color): # Move top left corner to x, y
+        r = self.rects
+        if self.shown:
+            if x == r[0] and y == r[1] and color == self.color:
+                return
+            if abs(x - r[0]) < self.width and abs(y - r[1]) < self.height:
+                vect = tft.solid_vect(color)
+                if vect is not None and self._merge(tft, x, y, vect):
+                    self.color = color
+                    return
+        self.hide(tft)
+        self.color = color
+        r[0] = x
+        r[1] = y
+        r[2] = x + self.width - 1
+        r[3] = y + self.height - 1
+        self.nrects = 1
+        self.show(tft)
+
+    def _draw(self, tft):
+        r = self.rects
+        tft.fill_rectangle(r[0], r[1], r[2], r[3], self.color)
+
+    def _merge(self, tft, x, y, vect):
+        r = self.rects
+        w = self.width
+        h = self.height
+        ux0 = min(x, r[0])
+        uy0 = min(y, r[1])
+        ux1 = max(x, r[0]) + w - 1
+        uy1 = max(y, r[1]) + h - 1
+        ubytes = (ux1 - ux0 + 1) * 3 # Bytes per row of union
+        nbytes = ubytes * (uy1 - uy0 + 1)
+        if nbytes > len(self.work):
+            return False
+        if vect is not self.rowvect:
+            self.row = bytes(vect) * w
+            self.rowvect = vect
+        row = self.row
+        wmv = self.wmv
+        mv = self.mv
+        rbytes = w * 3
+        tft.readArea(ux0, uy0, ux1, uy1, wmv)
+        dst = (r[1] - uy0) * ubytes + (r[0] - ux0) * 3
+        src = 0
+        for _ in range(h): # Replace old sprite with saved background
+            wmv[dst : dst + rbytes] = mv[src : src + rbytes]
+            dst += ubytes
+            src += rbytes
+        dst = (y - uy0) * ubytes + (x - ux0) * 3
+        src = 0
+        for _ in range(h): # Save background at new position and draw
+            mv[src : src + rbytes] = wmv[dst : dst + rbytes]
+            wmv[dst : dst + rbytes] = row
+            dst += ubytes
+            src += rbytes
+        tft.writeArea(ux0, uy0, ux1, uy1, wmv)
+        r[0] = x
+        r[1] = y
+        r[2] = x + w - 1
+        r[3] = y + h - 1
+        return True
+
+# A one pixel wide line such as a pointer. length is the longest line which
+# will be drawn.
+class LineSprite(Sprite):
+    def __init__(self, length):
+        n = int(length) + 2
+        super().__init__(n, n)
+
+    def move(self, tft, x1, y1, x2, y2, color):
+        self.hide(tft)
+        self.color = color
+        self._runs(x1, y1, x2, y2)
+        self.show(tft)
+
+    def _draw(self, tft):
+        r = self.rects
+        color = self.color
+        for i in range(0, 4 * self.nrects, 4):
+            if r[i + 1] == r[i + 3]:
+                tft.draw_hline(r[i], r[i + 1], r[i + 2] - r[i] + 1, color)
+            else:
+                tft.draw_vline(r[i], r[i + 1], r[i + 3] - r[i + 1] + 1, color)
+
+    def _add(self, x1, y1, x2, y2): # Append a run (coordinates in either order)
+        i = 4 * self.nrects
+        r = self.rects
+        r[i] = min(x1, x2)
+        r[i + 1] = min(y1, y2)
+        r[i + 2] = max(x1, x2)
+        r[i + 3] = max(y1, y2)
+        self.nrects += 1
+
+# Split the line into runs as TFT.drawLine does
+    def _runs(self, x1, y1, x2, y2):
+        self.nrects = 0
+        if y1 == y2 or x1 == x2:
+            self._add(x1, y1, x2, y2)
+            return
+        dx, xstep  = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
+        dy, ystep  = (y2 - y1, 1) if y2 > y1 else (y1 - y2, -1)
+        col, row = x1, y1
+        if dx < dy:
+            start = row
+            t = - (dy >> 1)
+            while True:
+                if row == y2:
+                    self._add(col, start, col, row)
+                    return
+                row += ystep
+                t += dx
+                if t >= 0:
+                    self._add(col, start, col, row - ystep)
+                    col += xstep
+                    t -= dy
+                    start = row
+        else:
+            start = col
+            t = - (dx >> 1)
+            while True:
+                if col == x2:
+                    self._add(start, row, col, row)
+                    return
+                col += xstep
+                t += dy
+                if t >= 0:
+                    self._add(start, row, col - xstep, row)
+                    row += ystep
+                    t -= dx
+                    start = col
@@ -37,9 +37,16 @@
 # Then LED must be hard tied to Vcc and /CS to GND.
 #
 
-import pyb, stm
+try:
+    import pyb, stm
+    from tft.driver import TFT_io
+except ImportError: # Not a Pyboard (e.g. Unix build): simulate the display
+    pyb = None
+    from tft.driver import TFT_sim as TFT_io
+from tft.driver.shadow import Shadow
+from tft.driver.glyphcache import GlyphCache
 from uctypes import addressof
-from tft.driver import TFT_io
+from utime import sleep_ms
 import gc
 
 # define constants
@@ -57,14 +64,37 @@ POWER  = const(1 << 9) ## Y4
 PORTRAIT = const(1)
 LANDSCAPE = const(0)
 
+_CIRCLE_CACHE = const(8) ## No. of radii whose rasterisation is retained
+_COLOR_CACHE = const(32) ## No. of colors whose byte arrays are retained
+_TEXT_PIXELS = const(2048) ## Max pixels in a run of text: sets buffer sizes
+
+# Return a table of the widths of the printable ASCII characters in a font.
+# Tables are built on first use so that text can be measured without calling
+# get_ch. Characters outside this range must be measured with get_ch.
+_widths = {}
+
+def char_widths(font):
+    try:
+        return _widths[font]
+    except KeyError:
+        pass
+    widths = bytearray(95)
+    for n in range(95):
+        widths[n] = font.get_ch(chr(n + 32))[2]
+    _widths[font] = widths
+    return widths
+
 class TFT:
+    _circles = {}  # Circle rasterisations keyed by radius
+    _vects = {}  # Color byte arrays keyed by color tuple
 
     def __init__(self, controller = "SSD1963", lcd_type = "LB04301", orientation = LANDSCAPE,  
-                 v_flip = False, h_flip = False, power_control = True):
-        self.tft_init(controller, lcd_type, orientation, v_flip, h_flip)
+                 v_flip = False, h_flip = False, power_control = True, shadow = 0):
+        self.tft_init(controller, lcd_type, orientation, v_flip, h_flip, shadow = shadow)
 
     def tft_init(self, controller = "SSD1963", lcd_type = "LB04301", orientation = LANDSCAPE,  
-                 v_flip = False, h_flip = False, power_control = True):
+                 v_flip = False, h_flip = False, power_control = True, shadow = 0):
+        global TFT_io
 #
 # For convenience, define X1..X1 and Y9..Y12 as output port using thy python functions.
 # X1..X8 will be redefind on the fly as Input by accessing the MODER control registers
@@ -83,38 +113,36 @@ class TFT:
         self.setColor((255, 255, 255)) # set FG color to white as can be.
         self.setBGColor((0, 0, 0))     # set BG to black
         self.bg_buf = bytearray()
+        self.text_bits = bytearray() # Bitmap of a run of text
+        self.glyph_cache = None
 #
         self.pin_led = None     # deferred init Flag
-        self.power_control = power_control
+        self.power_control = power_control and pyb is not None
         if self.power_control:
 # special treat for Power Pin
             self.pin_power = pyb.Pin("Y4", pyb.Pin.OUT_PP)
             self.power(True)    ## switch Power on
 #            
-        pyb.delay(10)
-# this may have to be moved to the controller specific section
-        if orientation == PORTRAIT:
-            self.setXY = TFT_io.setXY_P
-            self.drawPixel = TFT_io.drawPixel_P
-        else:
-            self.setXY = TFT_io.setXY_L
-            self.drawPixel = TFT_io.drawPixel_L
+        sleep_ms(10)
+        if isinstance(TFT_io, Shadow): # Initialised before
+            TFT_io = TFT_io.io
         self.swapbytes = TFT_io.swapbytes
         self.swapcolors = TFT_io.swapcolors
 #  ----------
-        for pin_name in ["X1", "X2", "X3", "X4", "X5", "X6", "X7", "X8",
-                   "Y10", "Y11", "Y12"]:
-            pin = pyb.Pin(pin_name, pyb.Pin.OUT_PP) # set as output
-            pin.value(1)  ## set high as default
+        if pyb is not None: # Simulated display has no pins
+            for pin_name in ["X1", "X2", "X3", "X4", "X5", "X6", "X7", "X8",
+                       "Y10", "Y11", "Y12"]:
+                pin = pyb.Pin(pin_name, pyb.Pin.OUT_PP) # set as output
+                pin.value(1)  ## set high as default
 # special treat for Reset
-        self.pin_reset = pyb.Pin("Y9", pyb.Pin.OUT_PP)
+            self.pin_reset = pyb.Pin("Y9", pyb.Pin.OUT_PP)
 # Reset the device
-        self.pin_reset.value(1)  ## do a hard reset
-        pyb.delay(10)
-        self.pin_reset.value(0)  ## Low
-        pyb.delay(20)
-        self.pin_reset.value(1)  ## set high again
-        pyb.delay(20)
+            self.pin_reset.value(1)  ## do a hard reset
+            sleep_ms(10)
+            self.pin_reset.value(0)  ## Low
+            sleep_ms(20)
+            self.pin_reset.value(1)  ## set high again
+            sleep_ms(20)
 #
 # Now initialiize the LCD
 # This is for the SSD1963 controller and two specific LCDs. More may follow.
@@ -126,11 +154,11 @@ class TFT:
               # PLLClock = Crystal * (Mult + 1) / (Div + 1)
               # The intermediate value Crystal * (Mult + 1) must be between 250MHz and 750 MHz
             TFT_io.tft_cmd_data(0xe0, bytearray(b'\x01'), 1) # PLL Enable
-            pyb.delay(10)
+            sleep_ms(10)
             TFT_io.tft_cmd_data(0xe0, bytearray(b'\x03'), 1)
-            pyb.delay(10)
+            sleep_ms(10)
             TFT_io.tft_cmd(0x01)                     # software reset
-            pyb.delay(10)
+            sleep_ms(10)
 #
 # Settings for the LCD
 #
@@ -258,6 +286,20 @@ class TFT:
             print("Wrong Parameter controller: ", controller)
             return
 #
+# Optionally hold display memory in a shadow framebuffer of the given number of
+# 32x32 pixel tiles so that reading it back need not access the bus.
+#
+        if shadow:
+            width, height = self.getScreensize()
+            TFT_io = Shadow(TFT_io, width, height, shadow, orientation == PORTRAIT)
+# this may have to be moved to the controller specific section
+        if orientation == PORTRAIT:
+            self.setXY = TFT_io.setXY_P
+            self.drawPixel = TFT_io.drawPixel_P
+        else:
+            self.setXY = TFT_io.setXY_L
+            self.drawPixel = TFT_io.drawPixel_L
+#
 # Set character printing defaults
 #
         self.text_font = None
@@ -280,6 +322,8 @@ class TFT:
 # set backlight brightness
 #
     def backlight(self, percent):
+        if pyb is None: # Simulated display
+            return
 # deferred init of LED PIN
         if self.pin_led is None:
 # special treat for BG LED
@@ -330,6 +374,23 @@ class TFT:
             self.BGcolorvect[1], self.BGcolorvect[0],0,
             self.colorvect[2], self.colorvect[1], self.colorvect[0],0])
 #
+# Return the byte array for a color, or default if color is None. Arrays are
+# interned so that drawing in a color already seen allocates no memory.
+#
+    def _vect(self, color, default):
+        if color is None:
+            return default
+        try:
+            return self._vects[color]
+        except KeyError:
+            if len(self._vects) >= _COLOR_CACHE:
+                self._vects.clear()
+            vect = bytearray(color)
+            self._vects[color] = vect
+            return vect
+        except TypeError:  # Unhashable e.g. a list
+            return bytearray(color)
+#
 # get the color used for the draw commands
 #
     def getColor(self):
@@ -347,10 +408,39 @@ class TFT:
         self.setXY(x, y, x, y)
         TFT_io.displaySCR_AS(color, 1)  #
 #
+# Read the pixels of a rectangle into data, 3 bytes per pixel in the order the
+# display holds them. With a shadow framebuffer the bus may not be accessed.
+#
+    def readArea(self, x1, y1, x2, y2, data):
+        self.setXY(x1, y1, x2, y2)
+        TFT_io.tft_read_cmd_data_AS(0x2e, data, (x2 - x1 + 1) * (y2 - y1 + 1) * 3)
+#
+# Write pixels as returned by readArea to a rectangle
+#
+    def writeArea(self, x1, y1, x2, y2, data):
+        self.setXY(x1, y1, x2, y2)
+        TFT_io.tft_write_data_AS(data, (x2 - x1 + 1) * (y2 - y1 + 1) * 3)
+#
+# Return the shadow framebuffer or None
+#
+    def getShadow(self):
+        return TFT_io if isinstance(TFT_io, Shadow) else None
+#
+# Hold glyphs of opaque text, rendered, in a cache of up to budget bytes. A
+# budget of 0 removes the cache.
+#
+    def setGlyphCache(self, budget):
+        self.glyph_cache = GlyphCache(TFT_io, budget) if budget else None
+#
+# Return the glyph cache or None
+#
+    def getGlyphCache(self):
+        return self.glyph_cache
+#
 # clear screen, set it to BG color.
 #
     def clrSCR(self, color = None):
-        colorvect = self.BGcolorvect if color is None else bytearray(color)
+        colorvect = self._vect(color, self.BGcolorvect)
         self.clrXY()
         TFT_io.fillSCR_AS(colorvect, (self.disp_x_size + 1) * (self.disp_y_size + 1))
         self.setScrollArea(0, self.disp_y_size + 1, 0)
@@ -366,46 +456,68 @@ class TFT:
             self.setXY(0, 0, self.disp_y_size, self.disp_x_size)
 #
 # Draw a line from x1, y1 to x2, y2 with the color set by setColor()
-# Straight port from the UTFT Library at Rinky-Dink Electronics
+# Run-sliced Bresenham: pixels are gathered into straight runs along the major
+# axis and each run is written with a single window rather than one per pixel.
 #
     def drawLine(self, x1, y1, x2, y2, color = None):
+        colorvect = self._vect(color, self.colorvect)
         if y1 == y2:
-            self.drawHLine(x1, y1, x2 - x1 + 1, color)
+            self._hrun(x1, x2, y1, colorvect)
         elif x1 == x2:
-            self.drawVLine(x1, y1, y2 - y1 + 1, color)
+            self._vrun(x1, y1, y2, colorvect)
         else:
-            colorvect = self.colorvect if color is None else bytearray(color)
             dx, xstep  = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
             dy, ystep  = (y2 - y1, 1) if y2 > y1 else (y1 - y2, -1)
             col, row = x1, y1
+            start = col if dx >= dy else row
             if dx < dy:
                 t = - (dy >> 1)
                 while True:
-                    self.drawPixel(col, row, colorvect)
                     if row == y2:
+                        self._vrun(col, start, row, colorvect)
                         return
                     row += ystep
                     t += dx
                     if t >= 0:
+                        self._vrun(col, start, row - ystep, colorvect)
                         col += xstep
                         t -= dy
+                        start = row
             else:
                 t = - (dx >> 1)
                 while True:
-                    self.drawPixel(col, row, colorvect)
                     if col == x2:
+                        self._hrun(start, col, row, colorvect)
                         return
                     col += xstep
                     t += dy
                     if t >= 0:
+                        self._hrun(start, col - xstep, row, colorvect)
                         row += ystep
                         t -= dx
+                        start = col
+#
+# Write a run of pixels from x1 to x2 inclusive (either order) on row y
+#
+    def _hrun(self, x1, x2, y, colorvect):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        self.setXY(x1, y, x2, y)
+        TFT_io.fillSCR_AS(colorvect, x2 - x1 + 1)
+#
+# Write a run of pixels from y1 to y2 inclusive (either order) in column x
+#
+    def _vrun(self, x, y1, y2, colorvect):
+        if y1 > y2:
+            y1, y2 = y2, y1
+        self.setXY(x, y1, x, y2)
+        TFT_io.fillSCR_AS(colorvect, y2 - y1 + 1)
 #
 # Draw a horizontal line with 1 Pixel width, from x,y to x + l - 1, y
 # Straight port from the UTFT Library at Rinky-Dink Electronics
 #
     def drawHLine(self, x, y, l, color = None): # draw horiontal Line
-        colorvect = self.colorvect if color is None else bytearray(color)
+        colorvect = self._vect(color, self.colorvect)
         if l < 0:  # negative length, swap parameters
             l = -l
             x -= l
@@ -416,7 +528,7 @@ class TFT:
 # Straight port from the UTFT Library at Rinky-Dink Electronics
 #
     def drawVLine(self, x, y, l, color = None): # draw horiontal Line
-        colorvect = self.colorvect if color is None else bytearray(color)
+        colorvect = self._vect(color, self.colorvect)
         if l < 0:  # negative length, swap parameters
             l = -l
             y -= l
@@ -445,10 +557,7 @@ class TFT:
         if y1 > y2:
             y1, y2 = y2, y1
         self.setXY(x1, y1, x2, y2) # set display window
-        if color:
-            TFT_io.fillSCR_AS(bytearray(color), (x2 - x1 + 1) * (y2 - y1 + 1))
-        else:
-            TFT_io.fillSCR_AS(self.colorvect, (x2 - x1 + 1) * (y2 - y1 + 1))
+        TFT_io.fillSCR_AS(self._vect(color, self.colorvect), (x2 - x1 + 1) * (y2 - y1 + 1))
 
 #
 # Draw smooth rectangle from x1, y1, to x2, y2
@@ -460,7 +569,7 @@ class TFT:
         if y1 > y2:
             y1, y2 = y2, y1
         if (x2-x1) > 4 and (y2-y1) > 4:
-            colorvect = self.colorvect if color is None else bytearray(color)
+            colorvect = self._vect(color, self.colorvect)
             self.drawPixel(x1 + 2,y1 + 1, colorvect)
             self.drawPixel(x1 + 1,y1 + 2, colorvect)
             self.drawPixel(x2 - 2,y1 + 1, colorvect)
@@ -497,57 +606,83 @@ class TFT:
                     self.drawHLine(x1, y1 + i, x2 - x1 + 1, color)
                     self.drawHLine(x1, y2 - i, x2 - x1 + 1, color)
 #
-# draw a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
-#
-    def drawCircle(self, x, y, radius, color = None):
-
-        colorvect = self.colorvect if color is None else bytearray(color)
-
+# Return the rasterisation of a circle of given radius as a tuple (runs, widths).
+# runs holds (b, a0, a1) for the first octant of the midpoint algorithm: pixels
+# a0..a1 lie at distance b from the centre. Mirroring each run about the eight
+# octants gives the outline as horizontal and vertical runs. widths[dy] is the
+# half width of the outline dy rows from the centre and defines a filled circle.
+# Results are cached as controls typically use a small number of radii.
+#
+    def _circle_spans(self, radius):
+        try:
+            return self._circles[radius]
+        except KeyError:
+            pass
+        runs = []
+        widths = bytearray(radius + 1) if radius < 256 else [0] * (radius + 1)
         f = 1 - radius
-        ddF_x = 1
         ddF_y = -2 * radius
         x1 = 0
         y1 = radius
-
-        self.drawPixel(x, y + radius, colorvect)
-        self.drawPixel(x, y - radius, colorvect)
-        self.drawPixel(x + radius, y, colorvect)
-        self.drawPixel(x - radius, y, colorvect)
-
-        while x1 < y1:
-            if f >= 0:
-	            y1 -= 1
-	            ddF_y += 2
-	            f += ddF_y
+        a0 = 0
+        while True:
+            if x1 >= y1 or f >= 0:  # End of a run of constant y1
+                runs.append((y1, a0, x1))
+                if widths[y1] < x1:
+                    widths[y1] = x1
+                for a in range(a0, x1 + 1):
+                    if widths[a] < y1:
+                        widths[a] = y1
+                if x1 >= y1:
+                    break
+                y1 -= 1
+                ddF_y += 2
+                f += ddF_y
+                a0 = x1 + 1
             x1 += 1
-            ddF_x += 2
-            f += ddF_x
-            self.drawPixel(x + x1, y + y1, colorvect)
-            self.drawPixel(x - x1, y + y1, colorvect)
-            self.drawPixel(x + x1, y - y1, colorvect)
-            self.drawPixel(x - x1, y - y1, colorvect)
-            self.drawPixel(x + y1, y + x1, colorvect)
-            self.drawPixel(x - y1, y + x1, colorvect)
-            self.drawPixel(x + y1, y - x1, colorvect)
-            self.drawPixel(x - y1, y - x1, colorvect)
+            f += 2 * x1 + 1
+        if len(self._circles) >= _CIRCLE_CACHE:
+            self._circles.clear()
+        self._circles[radius] = runs, widths
+        return runs, widths
+#
+# draw a circle at x, y with radius
+# The outline is drawn as runs: horizontal near the top and bottom and vertical
+# near the sides.
+#
+    def drawCircle(self, x, y, radius, color = None):
+        colorvect = self._vect(color, self.colorvect)
+        x, y, radius = int(x), int(y), int(radius)
+        hrun, vrun = self._hrun, self._vrun
+        for b, a0, a1 in self._circle_spans(radius)[0]:
+            if a0 == 0:
+                hrun(x - a1, x + a1, y - b, colorvect)
+                hrun(x - a1, x + a1, y + b, colorvect)
+                vrun(x - b, y - a1, y + a1, colorvect)
+                vrun(x + b, y - a1, y + a1, colorvect)
+            else:
+                hrun(x - a1, x - a0, y - b, colorvect)
+                hrun(x + a0, x + a1, y - b, colorvect)
+                hrun(x - a1, x - a0, y + b, colorvect)
+                hrun(x + a0, x + a1, y + b, colorvect)
+                vrun(x - b, y - a1, y - a0, colorvect)
+                vrun(x - b, y + a0, y + a1, colorvect)
+                vrun(x + b, y - a1, y - a0, colorvect)
+                vrun(x + b, y + a0, y + a1, colorvect)
 #
 # fill a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
-# Instead of calculating x = sqrt(r*r - y*y), it searches the x
-# for r*r = x*x + x*x
+# Each row is a single span whose extent matches the outline drawn by drawCircle
 #
     def fillCircle(self, x, y, radius, color = None):
-        r_square = radius * radius * 4
-        for y1 in range (-(radius * 2), 1):
-            y_square = y1 * y1
-            for x1 in range (-(radius * 2), 1):
-                if x1*x1+y_square <= r_square:
-                    x1i = x1 // 2
-                    y1i = y1 // 2
-                    self.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
-                    self.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
-                    break;
+        colorvect = self._vect(color, self.colorvect)
+        x, y, radius = int(x), int(y), int(radius)
+        hrun = self._hrun
+        widths = self._circle_spans(radius)[1]
+        hrun(x - widths[0], x + widths[0], y, colorvect)
+        for dy in range(1, radius + 1):
+            w = widths[dy]
+            hrun(x - w, x + w, y - dy, colorvect)
+            hrun(x - w, x + w, y + dy, colorvect)
 #
 # Draw a bitmap at x,y with size sx, sy
 # mode determines the type of expected data
@@ -667,6 +802,7 @@ class TFT:
         self.text_color = (bytearray(self.text_bgcolor)
                            + bytearray(self.text_fgcolor)
                            + bytearray([self.transparency]))
+        self.text_colors = bytes(self.text_color[0 : 6]) # Glyph cache key
 #
 # Get Text Style: return (color, bgcolor, font, transpareny, gap)
 #
@@ -719,15 +855,99 @@ class TFT:
         self.setTextPos(0, self.scroll_tfa)
 #
 # Print string s, returning the length of the printed string in pixels
+# Characters are gathered into runs which fit on the current line. Each run is
+# composed into a single bitmap and written to one window, with a single read
+# of the background if transparency is required.
 #
     def printString(self, s, bg_buf=None):
-        len = 0
-        for c in s:
-            cols = self.printChar(c, bg_buf)
-            if cols == 0: # could not print (any more)
-                break
-            len += cols
-        return len
+        font = self.text_font
+        if not font:
+            raise AttributeError('No font selected')
+        gap = self.text_gap
+        widths = char_widths(font)
+        maxwidth = _TEXT_PIXELS // self.text_rows # Max width of a run
+        length = 0
+        n = len(s)
+        start = 0
+        while start < n:
+            width = 0
+            end = start
+            while end < n:
+                idx = ord(s[end]) - 32
+                cols = widths[idx] if 0 <= idx < 95 else font.get_ch(s[end])[2]
+                if self.text_x + width + cols > self.text_width: # does the char fit on the screen?
+                    break
+                if width and width + cols + gap > maxwidth: # Start a new run
+                    break
+                width += cols + gap
+                end += 1
+            if end == start: # First char does not fit
+                if not self.text_scroll:
+                    break
+                self.printCR()      # CR
+                self.printNewline(True) # NL: advance to the next line
+                width = cols + gap # Print it regardless
+                end += 1
+            if self.glyph_cache is not None and not self.transparency:
+                self.printCached(s, start, end)
+            else:
+                self.printRun(s, start, end, width, bg_buf)
+            length += width
+            start = end
+        return length
+#
+# Print characters s[start:end] as a run of the given width in pixels
+#
+    def printRun(self, s, start, end, width, bg_buf=None):
+        font = self.text_font
+        gap = self.text_gap
+        rows = self.text_rows
+        pix_count = width * rows
+        if pix_count <= 0:
+            return
+        if len(self.text_bits) < (pix_count + 7) // 8:
+            self.text_bits = bytearray((pix_count + 7) // 8)
+        bits = self.text_bits
+        x = 0
+        while start < end:
+            fmv, _, cols = font.get_ch(s[start])
+            TFT_io.blit_charbitmap(bits, width, x, addressof(fmv), rows, cols, cols + gap)
+            x += cols + gap
+            start += 1
+# Retrieve Background data if transparency is required
+        if self.transparency:
+            if bg_buf is None or len(bg_buf) < pix_count * 3:
+                if len(self.bg_buf) < pix_count * 3:
+                    del(self.bg_buf)
+                    gc.collect()
+                    self.bg_buf = bytearray(pix_count * 3) # Make it bigger
+                bg_buf = self.bg_buf
+            self.setXY(self.text_x, self.text_y, self.text_x + width - 1, self.text_y + rows - 1) # set area
+            TFT_io.tft_read_cmd_data_AS(0x2e, bg_buf, pix_count * 3) # read background data
+        else:
+            bg_buf = 0 # dummy assignment, since None is not accepted
+        self.setXY(self.text_x, self.text_y, self.text_x + width - 1, self.text_y + rows - 1) # set area
+        TFT_io.displaySCR_charbitmap(bits, pix_count, self.text_color, bg_buf)
+        self.text_x += width
+#
+# Print characters s[start:end] from the glyph cache, one window per glyph
+#
+    def printCached(self, s, start, end):
+        cache = self.glyph_cache
+        font = self.text_font
+        gap = self.text_gap
+        rows = self.text_rows
+        color = self.text_colors
+        while start < end:
+            raster = cache.get(font, s[start], color, gap)
+            if raster is None: # Too large to cache
+                self.printRun(s, start, start + 1, font.get_ch(s[start])[2] + gap)
+            else:
+                cell = len(raster) // (rows * 3)
+                self.setXY(self.text_x, self.text_y, self.text_x + cell - 1, self.text_y + rows - 1) # set area
+                TFT_io.tft_write_data_AS(raster, len(raster))
+                self.text_x += cell
+            start += 1
 #
 # Print string c using the given char bitmap at location x, y, returning the width of the printed char in pixels
 #
@@ -29,6 +29,9 @@
 #
 import pyb, stm
 import uasyncio as asyncio
+from tft.driver.touch_filter import TouchFilter, MEAN, MEDIAN, IIR
+from tft.driver.touch_cal import fixed, transform
+from tft.driver.touch_sampler import TouchSampler
 
 # define constants
 #
@@ -57,18 +60,25 @@ T_GETZ2 = const(0xc8)  ## 8 bit resolution
 #
 X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
 Y_HIGH = const(4090)   ## highest reasonable Y value 
+_HALF_CLOCK = const(20) ## Delay loop iterations per half clock cycle (>200ns)
 
-class TOUCH:
+class TOUCH(TouchSampler):
 #
 # Init just sets the PIN's to In / out as required
 # async: set True if asynchronous operation intended
 # confidence: confidence level - number of consecutive touches with a margin smaller than the given level
 #       which the function will sample until it accepts it as a valid touch
 # margin: Difference from mean centre at which touches are considered at the same position 
-# delay: Delay between samples in ms. (n/a if asynchronous)
+# delay: Delay between samples in ms. (n/a if asynchronous unless irq is set)
+# irq: (asynchronous only) the panel is idle until the pen interrupt signals a
+#       touch. Samples are then taken every delay ms until the pen is lifted.
+# filter_mode: MEAN, MEDIAN or IIR: position reported for an accepted touch
+# spi: optional hardware SPI bus (mode 0, <= 2MHz) wired to the controller in
+#       place of the bit-banged pins. The pen interrupt pin is still used.
 #
     DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
-    def __init__(self, controller = "XPT2046", asyn = False, *, confidence = 5, margin = 50, delay = 10, calibration = None):
+    def __init__(self, controller = "XPT2046", asyn = False, *, confidence = 5, margin = 50, delay = 10,
+                 calibration = None, irq = False, filter_mode = MEAN, spi = None):
         if PCB_VERSION == 1:
             self.pin_clock = pyb.Pin("Y8", pyb.Pin.OUT_PP)
             self.pin_clock.value(0)
@@ -81,18 +91,32 @@ class TOUCH:
             self.pin_d_out = pyb.Pin("X12", pyb.Pin.OUT_PP)
             self.pin_d_in  = pyb.Pin("Y1", pyb.Pin.IN)
             self.pin_irq   = pyb.Pin("Y2", pyb.Pin.IN)
+        if spi is not None:
+            self.spi = spi
+            self._txbuf = bytearray(3)
+            self._rxbuf = bytearray(3)
+            self.touch_talk = self._spi_talk
 # set default values
-        self.ready = False
-        self.touched = False
-        self.x = 0
-        self.y = 0
+        super().__init__()
         self.buf_length = 0
+        self.filter_mode = filter_mode
         cal = TOUCH.DEFAULT_CAL if calibration is None else calibration
         self.asynchronous = False
         self.touch_parameter(confidence, margin, delay, cal)
         if asyn:
             self.asynchronous = True
-            asyncio.create_task(self._main_thread())
+            if irq:
+                try:
+                    self.pen_flag = asyncio.ThreadSafeFlag()
+                except AttributeError: # Old uasyncio: poll the pen interrupt pin
+                    self.pen_flag = None
+                else:
+                    self.extint = pyb.ExtInt(self.pin_irq, pyb.ExtInt.IRQ_FALLING,
+                                             pyb.Pin.PULL_UP, self._pen_down)
+                    self.extint.disable()
+                asyncio.create_task(self._irq_thread())
+            else:
+                asyncio.create_task(self._main_thread())
 
 # set parameters for get_touch()
 # res: Resolution in bits of the returned values, default = 10
@@ -104,14 +128,16 @@ class TOUCH:
     def touch_parameter(self, confidence = 5, margin = 50, delay = 10, calibration = None):
         if not self.asynchronous: # Ignore attempts to change on the fly.
             confidence = max(min(confidence, 25), 5)
-            if confidence != self.buf_length:
-                self.buff = [[0,0] for x in range(confidence)]
-                self.buf_length = confidence
             self.delay = max(min(delay, 100), 5)
             margin = max(min(margin, 100), 1)
             self.margin = margin * margin # store the square value
+            if confidence != self.buf_length:
+                self.filter = TouchFilter(confidence, self.margin, self.filter_mode)
+                self.buf_length = confidence
+            self.filter.margin = self.margin
             if calibration:
                 self.calibration = calibration
+                self.coeffs = fixed(calibration) # Integer form used by do_normalize
 
 # get_touch(): Synchronous use. get a touch value; Parameters:
 #
@@ -142,80 +168,35 @@ class TOUCH:
             if timeout <= 0: # after timeout, return None
                 return None
 #
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
+        filt = self.filter
+        filt.reset()
         while timeout > 0:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
-                    if raw:
-                        return (meanx, meany)
-                    else: 
-                        return self.do_normalize((meanx, meany))
+            if filt.ready(): # got one
+                if raw:
+                    return (filt.x, filt.y)
+                else: 
+                    return self.do_normalize((filt.x, filt.y))
 # get a new value 
             sample = self.raw_touch()  # get a touch
             if sample == None:
                 if not wait:
                     return None
-                nsamples = 0    # Invalidate buff
+                filt.reset()    # Invalidate buff
             else:
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples +1, buf_length)
+                filt.add(sample[0], sample[1]) # put in buff
             pyb.delay(self.delay)
             timeout -= self.delay
         return None
 
-# Asynchronous use: this thread maintains self.x and self.y
-    async def _main_thread(self):
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
-        await asyncio.sleep(0)
-        while True:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
-                    self.ready = True
-                    self.x, self.y = self.do_normalize((meanx, meany))
-            sample = self.raw_touch()  # get a touch
-            if sample == None:
-                self.touched = False
-                self.ready = False
-                nsamples = 0    # Invalidate buff
-            else:
-                self.touched = True
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples + 1, buf_length)
-            await asyncio.sleep(0)
-
-# Asynchronous get_touch
-    def get_touch_async(self):
-        if self.ready:
-            self.ready = False
-            return self.x, self.y
-        return None
 # 
 # do_normalize(touch)
 # calculate the screen coordinates from the touch values, using the calibration values
 # touch must be the tuple return by get_touch
+# The calibration is precompiled to integer coefficients: see touch_cal.py
 #
     def do_normalize(self, touch):
-        xmul = self.calibration[3] + (self.calibration[1] - self.calibration[3]) * (touch[1] / 4096)
-        xadd = self.calibration[2] + (self.calibration[0] - self.calibration[2]) * (touch[1] / 4096)
-        ymul = self.calibration[7] + (self.calibration[5] - self.calibration[7]) * (touch[0] / 4096)
-        yadd = self.calibration[6] + (self.calibration[4] - self.calibration[6]) * (touch[0] / 4096)
-        x = int((touch[0] + xadd) * xmul)
-        y = int((touch[1] + yadd) * ymul)
-        return (x, y)
+        k = self.coeffs
+        return (transform(k, touch[0], touch[1], 0), transform(k, touch[0], touch[1], 6))
 #
 # raw_touch(tuple)
 # raw read touch. Returns (x,y) or None
@@ -231,56 +212,85 @@ class TOUCH:
 # Send a command to the touch controller and wait for the response
 # cmd is the command byte
 # int is the expected size of return data bits
-# port is the gpio base port
 #
-# Straight down coding of the data sheet's timing diagram
-# This is the slow bytecode implementations
-# Clock low & high cycles must last at least 200ns
-# At the moment it is set to about 25us each, 
-# 1050µs total at 168 MHz clock rate.
-# Total net time for a 12 bit sample: ~ 1050 µs
+# Unless a hardware SPI bus was passed to the constructor, the native code
+# implementation _touch_talk is used.
 #
     def touch_talk(self, cmd, bits):
+        return _touch_talk(CONTROL_PORT, cmd, bits)
+#
+# Hardware SPI: the command byte is followed by a busy clock and the data,
+# MSB first. Transfers use preallocated buffers.
+#
+    def _spi_talk(self, cmd, bits):
+        tx = self._txbuf
+        rx = self._rxbuf
+        tx[0] = cmd
+        self.spi.write_readinto(tx, rx)
+        return (((rx[1] << 8) | rx[2]) >> (15 - bits)) & ((1 << bits) - 1)
 
-        global CONTROL_PORT
-        gpio_bsr = CONTROL_PORT + stm.GPIO_BSRRL
-        gpio_idr = CONTROL_PORT + stm.GPIO_IDR
+#
+# Bit-banged transfer to the touch controller: a straight coding of the data
+# sheet's timing diagram. port is the gpio base port.
+# Clock low & high cycles must last at least 200ns. Native code is fast enough
+# to violate this so each half cycle is padded with a delay loop of
+# _HALF_CLOCK iterations. The bytecode version took ~1050us per 12 bit sample.
+#
+@micropython.viper
+def _touch_talk(port: int, cmd: int, bits: int) -> int:
+    gpio = ptr16(port + int(stm.GPIO_BSRR)) # [0] sets bits, [1] clears them
+    idr = ptr16(port + int(stm.GPIO_IDR))
+    clock = int(T_CLOCK)
+    dout = int(T_DOUT)
+    din = int(T_DIN)
 #
 # now shift the command out, which is 8 bits 
 # data is sampled at the low-> high transient
 #
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Empty clock cycle before start, maybe obsolete
-        mask = 0x80  # high bit first
-        for i in range(8):
-            stm.mem16[gpio_bsr + 2] = T_CLOCK # set clock low in the beginning
-            if cmd & mask:
-                stm.mem16[gpio_bsr + 0] = T_DOUT # set data bit high
-            else:
-                stm.mem16[gpio_bsr + 2] = T_DOUT # set data bit low
-            for i in range(1): pass #delay
-            stm.mem16[gpio_bsr + 0] = T_CLOCK # set clock high
-            mask >>= 1
-        stm.mem16[gpio_bsr + 2] = T_CLOCK | T_DOUT# Another clock & data, low
-        stm.mem16[gpio_bsr + 0] = T_CLOCK # clock High
+    gpio[1] = clock # Empty clock cycle before start, maybe obsolete
+    mask = 0x80  # high bit first
+    while mask:
+        gpio[1] = clock # set clock low in the beginning
+        if cmd & mask:
+            gpio[0] = dout # set data bit high
+        else:
+            gpio[1] = dout # set data bit low
+        d = _HALF_CLOCK
+        while d:
+            d -= 1
+        gpio[0] = clock # set clock high
+        d = _HALF_CLOCK
+        while d:
+            d -= 1
+        mask >>= 1
+    gpio[1] = clock | dout # Another clock & data, low
+    d = _HALF_CLOCK
+    while d:
+        d -= 1
+    gpio[0] = clock # clock High
 #
 # now shift the data in, which is 8 or 12 bits 
 # data is sampled after the high->low transient
 #
-        result = 0
-        for i in range(bits):
-            stm.mem16[gpio_bsr + 2] = T_CLOCK # Clock low
-            if stm.mem16[gpio_idr + 0] & T_DIN: # get data
-                bit = 1
-            else:
-                bit = 0
-            result = (result << 1) | bit # shift data in
-            stm.mem16[gpio_bsr + 0] = T_CLOCK # Clock high
+    result = 0
+    while bits:
+        gpio[1] = clock # Clock low
+        d = _HALF_CLOCK
+        while d:
+            d -= 1
+        result <<= 1
+        if idr[0] & din: # get data
+            result |= 1
+        gpio[0] = clock # Clock high
+        d = _HALF_CLOCK
+        while d:
+            d -= 1
+        bits -= 1
 #
 # another clock cycle, maybe obsolete
 #
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Another clock toggle, low
-        stm.mem16[gpio_bsr + 0] = T_CLOCK # clock High
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Clock low
+    gpio[1] = clock # Another clock toggle, low
+    gpio[0] = clock # clock High
+    gpio[1] = clock # Clock low
 # now we're ready to leave
-        return result
-
+    return result
@@ -0,0 +1,108 @@
+# touch_cal.py Calibration of resistive touch panels
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Screen coordinates are modelled as quadratics in the raw coordinates rx, ry:
+# x = c0 + c1*rx + c2*ry + c3*rx*ry + c4*rx*rx + c5*ry*ry
+# A calibration is a tuple of the six coefficients for x followed by the six
+# for y. The 8 element tuples used by earlier versions are also accepted.
+# fixed() compiles a calibration to integers so that transform() uses integer
+# arithmetic only and does not allocate. fit() computes a calibration from a
+# set of raw touches at known screen positions. This module does not access
+# the hardware so may be run on any host.
+
+from micropython import const
+
+_SHIFT = const(16)  # Fixed point scaling of constant and linear terms
+_QSHIFT = const(12)  # Extra scaling of quadratic terms
+_NTERMS = const(6)
+
+# Expand a calibration of the form (-3917, -0.127, -3923, -0.1267, ...) used by
+# touch_bytecode versions which evaluated x = (rx + xadd) * xmul, with xadd and
+# xmul interpolated across the panel.
+def legacy(cal):
+    res = []
+    for offs in (0, 4):  # x is interpolated across ry, y across rx
+        a = cal[offs + 2]
+        b = (cal[offs] - cal[offs + 2]) / 4096
+        m = cal[offs + 3]
+        n = (cal[offs + 1] - cal[offs + 3]) / 4096
+        # (r + a + b*s) * (m + n*s) with r the axis' own raw value
+        if offs:  # r is ry, s is rx
+            res.extend((a * m, a * n + b * m, m, n, b * n, 0))
+        else:  # r is rx, s is ry
+            res.extend((a * m, m, a * n + b * m, n, 0, b * n))
+    return tuple(res)
+
+# Return the integer coefficients of a calibration. The constant term includes
+# the rounding offset.
+def fixed(cal):
+    if len(cal) == 8:
+        cal = legacy(cal)
+    res = []
+    for offs in (0, _NTERMS):
+        res.append(round(cal[offs] * (1 << _SHIFT)) + (1 << (_SHIFT - 1)))
+        res.extend(round(c * (1 << _SHIFT)) for c in cal[offs + 1 : offs + 3])
+        res.extend(round(c * (1 << (_SHIFT + _QSHIFT))) for c in cal[offs + 3 : offs + _NTERMS])
+    return tuple(res)
+
+# Screen coordinate from raw values. k is the result of fixed(), offs is 0 for
+# x and 6 for y. Quadratic terms are folded into the linear ones to preserve
+# precision. Intermediate values fit in a small int for raw values < 4096.
+def transform(k, rx, ry, offs):
+    return (k[offs] + rx * (k[offs + 1] + ((k[offs + 3] * ry + k[offs + 4] * rx) >> _QSHIFT))
+            + ry * (k[offs + 2] + ((k[offs + 5] * ry) >> _QSHIFT))) >> _SHIFT
+
+# Least squares fit of raw touches to screen positions. Args: a list of raw
+# (rx, ry) tuples and a list of the corresponding screen (x, y) tuples.
+# bilinear: model the rx*ry term (needs >= 4 points) otherwise the fit is
+# affine (>= 3 points). More points than the minimum average out jitter.
+# Returns (calibration, rms_error, max_error) with errors in pixels.
+def fit(raw, screen, bilinear=True):
+    nterms = 4 if bilinear else 3
+    if len(raw) != len(screen) or len(raw) < nterms:
+        raise ValueError('Need at least {} raw and screen points'.format(nterms))
+    cal = []
+    for axis in (0, 1):
+        # Raw values are scaled to ~1.0 to condition the normal equations
+        rows = []
+        for (rx, ry), s in zip(raw, screen):
+            u = rx / 4096
+            v = ry / 4096
+            rows.append(((1, u, v, u * v)[:nterms], s[axis]))
+        c = _solve(rows, nterms)
+        c.extend([0] * (4 - nterms))
+        cal.extend((c[0], c[1] / 4096, c[2] / 4096, c[3] / 4096 / 4096, 0, 0))
+    cal = tuple(cal)
+    k = fixed(cal)
+    sum2 = 0
+    worst = 0
+    for (rx, ry), (x, y) in zip(raw, screen):
+        err = (transform(k, rx, ry, 0) - x) ** 2 + (transform(k, rx, ry, _NTERMS) - y) ** 2
+        sum2 += err
+        worst = max(worst, err)
+    return cal, (sum2 / len(raw)) ** 0.5, worst ** 0.5
+
+# Solve the normal equations of a linear least squares problem by Gaussian
+# elimination with partial pivoting.
+def _solve(rows, n):
+    a = [[0.0] * (n + 1) for _ in range(n)]
+    for terms, target in rows:
+        for i in range(n):
+            for j in range(n):
+                a[i][j] += terms[i] * terms[j]
+            a[i][n] += terms[i] * target
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-9:
+            raise ValueError('Calibration points are degenerate')
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            f = a[r][col] / a[col][col]
+            for j in range(col, n + 1):
+                a[r][j] -= f * a[col][j]
+    c = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        c[i] = (a[i][n] - sum(a[i][j] * c[j] for j in range(i + 1, n))) / a[i][i]
+    return c
@@ -0,0 +1,96 @@
+# touch_filter.py Filter for resistive touch panel samples
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Samples are held in a ring buffer of length confidence. Running sums of the
+# coordinates and of their squares are maintained, so the cost of adding a
+# sample and of testing the window is independent of its length. A touch is
+# accepted when the window is full and the mean square deviation of its samples
+# from their mean is within margin. Integer arithmetic is used throughout so
+# that no memory is allocated. With 12 bit samples and confidence <= 25 the
+# sums fit in a small int.
+
+MEAN = const(0)  # Report the mean of the window
+MEDIAN = const(1)  # Report the median of the window (cost grows with confidence)
+IIR = const(2)  # Smooth successive means while the pen is down
+_IIR_SHIFT = const(2)  # IIR coefficient is 1/4
+
+class TouchFilter:
+    def __init__(self, length, margin, mode=MEAN):
+        self.length = length
+        self.margin = margin  # Square of the permitted deviation
+        self.mode = mode
+        self.xs = [0] * length
+        self.ys = [0] * length
+        self.scratch = [0] * length if mode == MEDIAN else None
+        self.x = 0  # Filtered raw position of accepted touch
+        self.y = 0
+        self.reset()
+
+    def reset(self):  # Pen lifted: invalidate the window
+        self.nsamples = 0
+        self.ptr = 0
+        self.sx = 0
+        self.sy = 0
+        self.sxx = 0
+        self.syy = 0
+        self.smoothing = False  # IIR has no history
+
+    def add(self, x, y):
+        ptr = self.ptr
+        if self.nsamples == self.length:  # Discard oldest sample
+            ox = self.xs[ptr]
+            oy = self.ys[ptr]
+            self.sx -= ox
+            self.sy -= oy
+            self.sxx -= ox * ox
+            self.syy -= oy * oy
+        else:
+            self.nsamples += 1
+        self.xs[ptr] = x
+        self.ys[ptr] = y
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.syy += y * y
+        ptr += 1
+        self.ptr = 0 if ptr == self.length else ptr
+
+# If the window holds an acceptable touch set .x and .y and return True.
+# n * deviation = sum((x - mx)**2) = (sxx - mx * sx) - mx * (sx - n * mx) with
+# mx the integer mean. Terms are arranged to keep intermediate values small.
+    def ready(self):
+        n = self.length
+        if self.nsamples < n:
+            return False
+        sx = self.sx
+        sy = self.sy
+        mx = sx // n
+        my = sy // n
+        dev = (self.sxx - mx * sx) - mx * (sx - n * mx) + (self.syy - my * sy) - my * (sy - n * my)
+        if dev > self.margin * n:
+            return False
+        if self.mode == MEDIAN:
+            mx = self._median(self.xs)
+            my = self._median(self.ys)
+        elif self.mode == IIR:
+            if self.smoothing:
+                mx = self.x + ((mx - self.x) >> _IIR_SHIFT)
+                my = self.y + ((my - self.y) >> _IIR_SHIFT)
+            self.smoothing = True
+        self.x = mx
+        self.y = my
+        return True
+
+    def _median(self, data):  # Insertion sort into preallocated scratch list
+        buf = self.scratch
+        n = self.length
+        for i in range(n):
+            v = data[i]
+            j = i
+            while j and buf[j - 1] > v:
+                buf[j] = buf[j - 1]
+                j -= 1
+            buf[j] = v
+        return buf[n >> 1]
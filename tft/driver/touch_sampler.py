@@ -0,0 +1,84 @@
+# touch_sampler.py Asynchronous acquisition of touch panel samples
+# Adapted for (and requires) uasyncio V3
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# The sampling state machine of the touch panel driver. It does not access the
+# hardware so may be run, and tested with a simulated pin, on any host. A
+# subclass provides:
+# raw_touch() Returns (x, y) or None if the panel is not touched.
+# filter A TouchFilter. coeffs Calibration compiled by touch_cal.fixed().
+# delay Interval between samples (ms) when interrupt driven.
+# For interrupt driven operation also:
+# pin_irq The pen interrupt line: its value() is 0 while the panel is touched.
+# extint An object with enable() and disable() methods whose interrupt on a
+# falling edge of pin_irq calls _pen_down.
+# pen_flag A ThreadSafeFlag set by _pen_down, or None to poll pin_irq.
+
+import uasyncio as asyncio
+from tft.driver.touch_cal import transform
+
+class TouchSampler:
+    def __init__(self):
+        self.ready = False
+        self.touched = False
+        self.x = 0
+        self.y = 0
+        self.changed = asyncio.Event() # Set when ready or touched changes
+
+# Take a sample, maintaining self.x and self.y. Set the changed event when a
+# touch is ready or the pen is lifted. Return True if the panel is touched.
+    def _sample(self):
+        filt = self.filter
+        if filt.ready(): # got one
+            self.ready = True
+            k = self.coeffs # Avoid allocating a tuple
+            self.x = transform(k, filt.x, filt.y, 0)
+            self.y = transform(k, filt.x, filt.y, 6)
+            self.changed.set()
+        sample = self.raw_touch()  # get a touch
+        if sample == None:
+            if self.touched:
+                self.changed.set()
+            self.touched = False
+            self.ready = False
+            filt.reset()    # Invalidate buff
+            return False
+        self.touched = True
+        filt.add(sample[0], sample[1]) # put in buff
+        return True
+
+# Polled operation: sample on every pass of the scheduler
+    async def _main_thread(self):
+        await asyncio.sleep(0)
+        while True:
+            self._sample()
+            await asyncio.sleep(0)
+
+# Interrupt driven operation: idle until the pen is down, then sample every
+# delay ms until it is lifted. The pen interrupt line is low while touched,
+# but is disabled while sampling because conversions disturb it.
+    async def _irq_thread(self):
+        await asyncio.sleep(0)
+        while True:
+            if self.pin_irq.value(): # Pen is up
+                if self.pen_flag is None:
+                    await asyncio.sleep_ms(self.delay)
+                    continue
+                self.extint.enable()
+                if self.pin_irq.value(): # Pen down may precede enable
+                    await self.pen_flag.wait()
+                self.extint.disable()
+            while self._sample():
+                await asyncio.sleep_ms(self.delay)
+
+    def _pen_down(self, _): # Hard ISR
+        self.pen_flag.set()
+
+# Asynchronous get_touch
+    def get_touch_async(self):
+        if self.ready:
+            self.ready = False
+            return self.x, self.y
+        return None
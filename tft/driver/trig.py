@@ -0,0 +1,84 @@
+# trig.py Fixed point trigonometry for rotary widgets.
+
+# Released under the MIT License (MIT). See LICENSE.
+# Copyright (c) 2016-2020 Peter Hinch
+
+# Angles are integers with TURN units per revolution. Sines and cosines are
+# integers scaled by ONE. Both are looked up in tables of 256 intervals per
+# octant or quadrant and linearly interpolated, so the functions use integer
+# arithmetic only and allocate nothing. Results are within 2/ONE of math.sin
+# and math.cos, and atan2 is within 2 units (0.0002 radians) of math.atan2.
+# Coordinates passed to endx and endy are fixed point with FRAC fractional bits
+# (see fix) and lengths have 4 (see fixlen): endpoints of radii up to 2000
+# pixels stay within MicroPython's small integers.
+
+from array import array
+from micropython import const
+import math
+
+TURN = const(65536) # Angle units per revolution
+ONE = const(16384) # Sine of a quarter turn
+FRAC = const(18) # Fractional bits of a fixed point coordinate
+_QUARTER = const(16384)
+_SHIFT = const(6) # Angle units per table interval: 1 << _SHIFT
+_MASK = const(63)
+
+_sines = array('h', (round(ONE * math.sin(math.pi * n / 512)) for n in range(257)))
+# Angle of ratios y/x from 0 to 1 in steps of 1/256
+_atans = array('h', (round(TURN * math.atan(n / 256) / (2 * math.pi)) for n in range(257)))
+
+def angle(radians): # Convert from radians
+    return int(round(radians * TURN / (2 * math.pi)))
+
+def radians(a):
+    return a * 2 * math.pi / TURN
+
+def fix(v): # A coordinate in fixed point
+    return int(v * (1 << FRAC))
+
+def fixlen(v): # A length in fixed point
+    return int(v * 16)
+
+def sin(a):
+    a &= TURN - 1
+    r = a & (_QUARTER - 1)
+    if a & _QUARTER: # Second or fourth quadrant: descending
+        r = _QUARTER - r
+    i = r >> _SHIFT
+    s = _sines[i]
+    f = r & _MASK
+    if f:
+        s += ((_sines[i + 1] - s) * f) >> _SHIFT
+    return -s if a & (2 * _QUARTER) else s
+
+def cos(a):
+    return sin(a + _QUARTER)
+
+# Angle of the vector x, y in the range -TURN/2 to TURN/2, as math.atan2(y, x)
+def atan2(y, x):
+    ax = x if x >= 0 else -x
+    ay = y if y >= 0 else -y
+    if ax >= ay:
+        if not ax:
+            return 0
+        r = (ay << 14) // ax
+    else:
+        r = (ax << 14) // ay
+    i = r >> _SHIFT
+    a = _atans[i]
+    f = r & _MASK
+    if f:
+        a += ((_atans[i + 1] - a) * f) >> _SHIFT
+    if ay > ax:
+        a = _QUARTER - a
+    if x < 0:
+        a = 2 * _QUARTER - a
+    return -a if y < 0 else a
+
+# Screen coordinates of a point length lf from xf, yf in direction a, where an
+# angle of 0 is vertical and positive angles are clockwise.
+def endx(xf, lf, a):
+    return (xf + lf * sin(a)) >> FRAC
+
+def endy(yf, lf, a):
+    return (yf - lf * cos(a)) >> FRAC
@@ -7,14 +7,18 @@
 import uasyncio as asyncio
 import math
 import gc
-from tft.driver import TFT_io
+from utime import ticks_ms, ticks_us, ticks_diff
+from tft.driver.tft import TFT_io
 from tft.primitives.delay_ms import Delay_ms
-from tft.driver.tft import TFT
+from tft.driver.tft import TFT, char_widths
 from tft.driver.constants import *
 
 __version__ = (0, 7, 0)
 
 TWOPI = 2 * math.pi
+_SIZE_CACHE = const(16) # Max no. of string sizes retained per font
+_BAND_PIXELS = const(8192) # Max pixels filled between yields to the scheduler
+_CELL_BITS = const(5) # Touch index cells are 32 pixels square
 gc.collect()
 
 # *********** UTILITY FUNCTIONS ***********
@@ -36,12 +40,29 @@ class ugui_exception(Exception):
 def dolittle(*_):
     pass
 
+# Sizes of recently measured strings: a dict for each font, keyed by string.
+_sizes = {}
+
 def get_stringsize(s, font):
+    try:
+        sizes = _sizes[font]
+    except KeyError:
+        sizes = {}
+        _sizes[font] = sizes
+    try:
+        return sizes[s]
+    except KeyError:
+        pass
+    widths = char_widths(font)
     hor = 0
     for c in s:
-        _, vert, cols = font.get_ch(c)
-        hor += cols
-    return hor, vert
+        idx = ord(c) - 32
+        hor += widths[idx] if 0 <= idx < 95 else font.get_ch(c)[2]
+    size = (hor, font.height())
+    if len(sizes) >= _SIZE_CACHE:
+        sizes.clear()
+    sizes[s] = size
+    return size
 
 def print_centered(tft, x, y, s, color, font, clip=False, scroll=False):
     old_style = tft.getTextStyle()
@@ -67,6 +88,24 @@ def desaturate(color, factor): # Desaturate and dim
         f = int(max(color) / factor)
         return (f, f, f)
 
+# Add a damaged rectangle [x0, y0, x1, y1] to a list of disjoint rectangles.
+# Any rectangles it overlaps are removed and merged into it.
+def merge_rect(rects, rect):
+    x0, y0, x1, y1 = rect
+    merged = True
+    while merged:
+        merged = False
+        for r in rects:
+            if r[0] <= x1 and r[2] >= x0 and r[1] <= y1 and r[3] >= y0:
+                rects.remove(r)
+                x0 = min(x0, r[0])
+                y0 = min(y0, r[1])
+                x1 = max(x1, r[2])
+                y1 = max(y1, r[3])
+                merged = True
+                break
+    rects.append([x0, y0, x1, y1])
+
 # *********** TFT_G CLASS ************
 # Subclass TFT to enable greying out of controls
 # Some TFT methods call drawHLine and drawVLine: the bound variable 'raw` forces them
@@ -77,18 +116,29 @@ class TFT_G(TFT):
         self._is_grey = False
         self._desaturate = True
         self._factor = 2 # Default grey-out methd: dim colors
+        self._greys = {} # Greyed colors for current settings keyed by color
 
     def _getcolor(self, color):
         if self._is_grey:
-            if self._desaturate:
-                color = desaturate(color, self._factor)
-            else:
-                color = dim(color, self._factor)
+            try:
+                return self._greys[color]
+            except KeyError:
+                grey = self._grey(color)
+                self._greys[color] = grey
+                return grey
+            except TypeError:  # Unhashable e.g. a list
+                return self._grey(color)
         return color
 
+    def _grey(self, color):
+        if self._desaturate:
+            return desaturate(color, self._factor)
+        return dim(color, self._factor)
+
     def desaturate(self, value=None):
         if value is not None:
             self._desaturate = value
+            self._greys = {}
         return self._desaturate
 
     def dim(self, factor=None):
@@ -96,6 +146,7 @@ class TFT_G(TFT):
             if factor <= 1:
                 raise ValueError('Dim factor must be > 1')
             self._factor = factor
+            self._greys = {}
         return self._factor
 
     def skeleton(self): # Determine type of greying
@@ -104,6 +155,13 @@ class TFT_G(TFT):
     def usegrey(self, val): # tft.usegrey(True) sets greyed-out
         self._is_grey = val
 
+# Byte vector of a filled area in the current greying style. None if fills are
+# drawn as outlines (greyed out in skeleton style).
+    def solid_vect(self, color):
+        if self._is_grey and not self._factor:
+            return None
+        return self._vect(self._getcolor(color), None)
+
     def draw_rectangle(self, x1, y1, x2, y2, color):
         self.drawRectangle(x1, y1, x2, y2, self._getcolor(color))
 
@@ -152,6 +210,30 @@ class TFT_G(TFT):
     def draw_line(self, x1, y1, x2, y2, color):
         self.drawLine(x1, y1, x2, y2, self._getcolor(color))
 
+# Large fills block for tens of ms. These fill in horizontal bands, yielding to
+# the scheduler between bands so that other tasks continue to run.
+    async def fill_rectangle_async(self, x1, y1, x2, y2, color):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        rows = max(_BAND_PIXELS // (x2 - x1 + 1), 1)
+        while True:
+            yb = min(y1 + rows - 1, y2)
+            self.fillRectangle(x1, y1, x2, yb, color)
+            if yb == y2:
+                break
+            y1 = yb + 1
+            await asyncio.sleep_ms(0)
+
+    async def clr_scr_async(self, color=None): # Equivalent to clrSCR
+        width, height = self.getScreensize()
+        await self.fill_rectangle_async(0, 0, width - 1, height - 1,
+                                        self.getBGColor() if color is None else color)
+        self.setScrollArea(0, self.disp_y_size + 1, 0)
+        self.setScrollStart(0)
+        self.setTextPos(0, 0)
+
 # *********** BASE CLASSES ***********
 
 class Screen:
@@ -159,11 +241,62 @@ class Screen:
     tft = None
     objtouch = None
     is_shutdown = asyncio.Event()
+    deferred = False  # Damage tracking: value changes are drawn by the _render task
+    frame_ms = 0  # Minimum period of _render task (0 == no frame rate cap)
+    do_render = asyncio.Event()
+    gc_period = 100  # Garbage collection policy: see set_gc
+    gc_min_alloc = 2048
+    gc_idle_alloc = 512
+    gc_budget = None
+    _gc_stats = {'collections' : 0, 'idle' : 0, 'skipped' : 0, 'deferred' : 0, 'max_pause' : 0,
+                 'last_pause' : 0, 'rate' : 0}
 
     @classmethod
-    def setup(cls, tft, objtouch):
+    def setup(cls, tft, objtouch, *, deferred=False, fps=None):
         cls.objtouch = objtouch
         cls.tft = tft
+        cls.set_fps(fps)
+        cls.deferred = deferred or fps is not None
+
+# Cap the rate at which deferred updates are drawn. None: redraw on every
+# scheduler pass in which an update occurred.
+    @classmethod
+    def set_fps(cls, fps):
+        if fps is not None and fps <= 0:
+            raise ValueError('fps must be > 0')
+        cls.frame_ms = 0 if fps is None else int(1000 / fps)
+
+# The garbage collection task runs every period ms. It skips a collection if
+# fewer than min_alloc bytes have been allocated since the last, or fewer than
+# idle_alloc if the GUI is idle (no touch in progress, redraw pending or screen
+# opening): collections are thereby drawn into idle periods. If the last
+# collection took longer than budget_us, collections wait until the GUI is idle
+# unless less than a second's worth of allocation at the measured rate remains
+# free.
+    @classmethod
+    def set_gc(cls, *, period=100, min_alloc=2048, idle_alloc=512, budget_us=None):
+        if period <= 0 or min_alloc < 0 or idle_alloc < 0:
+            raise ValueError('Invalid garbage collection policy')
+        cls.gc_period = period
+        cls.gc_min_alloc = min_alloc
+        cls.gc_idle_alloc = idle_alloc
+        cls.gc_budget = budget_us
+
+# Counts of collections made (in total and while idle), skipped and deferred,
+# the longest and most recent pause (us) and the allocation rate (bytes/s).
+    @classmethod
+    def gc_stats(cls, reset=False):
+        stats = dict(cls._gc_stats)
+        if reset:
+            for key in ('collections', 'idle', 'skipped', 'deferred', 'max_pause'):
+                cls._gc_stats[key] = 0
+        return stats
+
+    @classmethod
+    def _idle(cls):
+        touch = cls.objtouch
+        return not (cls.do_render.is_set() or cls.current_screen.opening
+                    or (touch is not None and touch.touched))
 
 # get_tft() when called from user code, ensure greyed_out status is updated.
     @classmethod
@@ -184,12 +317,32 @@ class Screen:
 
     @classmethod
     def show(cls):
-        for obj in cls.current_screen.displaylist:
+        cs = cls.current_screen
+        cs.damaged = [] # Everything is about to be drawn
+        for obj in cs.displaylist:
+            obj.dirty = False
             if obj.visible: # In a buttonlist only show visible button
                 obj.redraw = True # Redraw static content
                 obj.draw_border()
                 obj.show()
 
+# Mark a region of the current screen as damaged. Every visible object which
+# overlaps it will be fully redrawn: the caller is responsible for blanking it.
+    @classmethod
+    def damage(cls, x0, y0, x1, y1): # Args must be sorted: x1 > x0 and y1 > y0
+        cs = cls.current_screen
+        merge_rect(cs.damaged, (x0, y0, x1, y1))
+        if cls.deferred:
+            cls.do_render.set()
+        else:
+            cs._flush()
+
+# Called by NoTouch.show_if_current when damage tracking is in use
+    @classmethod
+    def invalidate(cls, obj):
+        obj.dirty = True
+        cls.do_render.set()
+
     @classmethod
     def change(cls, cls_new_screen, *, forward=True, args=[], kwargs={}):
         init = cls.current_screen is None
@@ -200,6 +353,10 @@ class Screen:
                 if entry[1]:  # To be cancelled on screen change
                     entry[0].cancel()
         cs_old = cls.current_screen
+        # Superseded before it was drawn: stop drawing it. A Screen.change
+        # made by the drawing task itself leaves it to finish (see _open).
+        if cs_old.opening and cs_old.opener is not asyncio.current_task():
+            cs_old.opener.cancel()
         cs_old.on_hide() # Optional method in subclass
         if forward:
             if isinstance(cls_new_screen, ClassType):
@@ -210,10 +367,13 @@ class Screen:
             cs_new = new_screen
         else:
             cs_new = cls_new_screen # An object, not a class
+        if cs_old.scroller is not None: # Restore display memory to screen order
+            cs_old.scroller._unscroll(forward and cs_new.modal)
         cls.current_screen = cs_new
+        whole = cs_new.opening  # Drawing it was cancelled: redraw it all
+        cs_new.opening = True
         cs_new.on_open() # Optional subclass method
-        cs_new._do_open(cs_old) # Clear and redraw
-        cs_new.after_open() # Optional subclass method
+        cs_new.opener = asyncio.create_task(cs_new._open(cs_old, whole))
         if init:
             try:
                 asyncio.run(Screen.monitor())  # Starts and ends uasyncio
@@ -243,6 +403,7 @@ class Screen:
             raise OSError('You must create a Screen instance')
         if isinstance(obj, Touchable):
             cls.current_screen.touchlist.append(obj)
+            cls.current_screen.touchindex = None # Rebuild on next touch
         cls.current_screen.displaylist.append(obj)
 
     @classmethod
@@ -251,24 +412,37 @@ class Screen:
 
     def __init__(self):
         self.touchlist = []
+        self.touchindex = None  # Touchables keyed by grid cell: see _dispatch
         self.displaylist = []
         self.tasklist = []  # Allow instance to register tasks for shutdown
         self.modal = False
+        self.damaged = []  # Merged rectangles awaiting redraw
+        self.opening = False  # Screen is being drawn: touches are ignored
+        self.opener = None  # Task drawing the screen
+        self.scroller = None  # Object using the hardware scroll area
         if Screen.current_screen is None: # Initialising class and task
             asyncio.create_task(self._touchtest()) # One task only
+            asyncio.create_task(self._render())
             asyncio.create_task(self._garbage_collect())
         Screen.current_screen = self
         self.parent = None
 
     async def _touchtest(self): # Singleton task tests all touchable instances
         touch_panel = Screen.objtouch
+        if touch_panel is None: # No touch panel e.g. simulated display
+            return
+        changed = getattr(touch_panel, 'changed', None) # Event: else poll the panel
         while True:
-            await asyncio.sleep_ms(0)
+            if changed is None:
+                await asyncio.sleep_ms(0)
+            else:
+                await changed.wait()
+                changed.clear()
             if touch_panel.ready:
                 x, y = touch_panel.get_touch_async()
-                for obj in Screen.current_screen.touchlist:
-                    if obj.visible and not obj.greyed_out():
-                        obj._trytouch(x, y)
+                if Screen.current_screen.opening:
+                    continue
+                Screen.current_screen._dispatch(x, y)
             elif not touch_panel.touched:
                 for obj in Screen.current_screen.touchlist:
                     if obj.was_touched:
@@ -276,23 +450,102 @@ class Screen:
                         obj.busy = False
                         obj._untouched()
 
-    def _do_open(self, old_screen): # Aperture overrides
-        show_all = True
+# Pass a touch to the touchables whose bounding box may contain it. These are
+# found from an index of the grid cells covered by each touchable. The index is
+# built on demand because an object's size may be set after it is added.
+# Visibility and greying are tested here so changes don't invalidate it.
+# Negative coordinates share the cells on the top and left edges.
+    def _dispatch(self, x, y):
+        index = self.touchindex
+        if index is None:
+            index = self._build_index()
+        key = (max(x, 0) >> _CELL_BITS) | ((max(y, 0) >> _CELL_BITS) << 8)
+        for obj in index.get(key, ()):
+            if obj.visible and not obj.greyed_out():
+                obj._trytouch(x, y)
+
+    def _build_index(self):
+        index = {}
+        for obj in self.touchlist:
+            x0 = max(int(obj.location[0]), 0) >> _CELL_BITS
+            y0 = max(int(obj.location[1]), 0) >> _CELL_BITS
+            x1 = max(int(obj.location[0] + obj.width), 0) >> _CELL_BITS
+            y1 = max(int(obj.location[1] + obj.height), 0) >> _CELL_BITS
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    key = cx | (cy << 8)
+                    if key in index:
+                        index[key].append(obj)
+                    else:
+                        index[key] = [obj]
+        self.touchindex = index
+        return index
+
+# Singleton task redraws damaged regions and objects whose value has changed.
+# All updates made since the last pass are drawn once, in displaylist order.
+# If a frame rate is set, the task sleeps for the remainder of the frame: any
+# value changes in that time are coalesced and only the latest value drawn.
+    async def _render(self):
+        while True:
+            await Screen.do_render.wait()
+            Screen.do_render.clear()
+            start = ticks_ms()
+            Screen.current_screen._flush()
+            if Screen.frame_ms:
+                await asyncio.sleep_ms(max(Screen.frame_ms - ticks_diff(ticks_ms(), start), 0))
+
+    def _flush(self):
+        rects = self.damaged
+        self.damaged = []
+        for obj in self.displaylist:
+            dirty = obj.dirty
+            obj.dirty = False
+            if obj.visible:
+                for r in rects:
+                    if obj.overlaps(*r):
+                        obj.redraw = True # Redraw static content
+                        obj.draw_border()
+                        obj.show()
+                        break
+                else:
+                    if dirty:
+                        obj.show()
+
+# Clear and redraw the screen. Fills yield to the scheduler, so the screen may
+# be changed again before drawing is complete. Screen.change then cancels this
+# task, leaving opening set: if the screen is shown again it is drawn in whole.
+    async def _open(self, old_screen, whole):
+        await self._do_open(old_screen, whole)
+        self.opening = False
+        if Screen.current_screen is self:
+            self.after_open() # Optional subclass method
+
+    async def _do_open(self, old_screen, whole): # Aperture overrides
+        if self._uncover(old_screen):
+            return
         tft = Screen.get_tft()
 # If opening a Screen from an Aperture just blank and redraw covered area
-        if old_screen.modal:
-            show_all = False
+        if old_screen.modal and not whole:
             x0, y0, x1, y1 = old_screen._list_dims()
-            tft.fill_rectangle(x0, y0, x1, y1, tft.getBGColor()) # Blank to screen BG
-            for obj in [z for z in self.displaylist if z.overlaps(x0, y0, x1, y1)]:
-                if obj.visible:
-                    obj.redraw = True # Redraw static content
-                    obj.draw_border()
-                    obj.show()
+            await tft.fill_rectangle_async(x0, y0, x1, y1, tft.getBGColor()) # Blank to screen BG
+            if Screen.current_screen is self:
+                Screen.damage(x0, y0, x1, y1)
 # Normally clear the screen and redraw everything
         else:
-            tft.clrSCR()
-            Screen.show()
+            await tft.clr_scr_async()
+            if Screen.current_screen is self:
+                Screen.show()
+
+# If old_screen is an Aperture closing over this screen and it saved the pixels
+# under it, write them back and draw objects updated while they were covered.
+    def _uncover(self, old_screen):
+        if old_screen.parent is not self or not old_screen._restore():
+            return False
+        self._flush()
+        return True
+
+    def _restore(self): # Aperture overrides
+        return False
 
     def on_open(self): # Optionally implemented in subclass
         return
@@ -309,21 +562,56 @@ class Screen:
         self.tasklist.append([task, on_change])
 
     async def _garbage_collect(self):
+        stats = Screen._gc_stats
+        last = prev = gc.mem_alloc()
         while True:
-            await asyncio.sleep_ms(100)
+            period = Screen.gc_period
+            await asyncio.sleep_ms(period)
+            alloc = gc.mem_alloc()
+            if alloc < last:  # The allocator has collected
+                last = prev = alloc
+                continue
+            stats['rate'] = (stats['rate'] * 3 + (alloc - prev) * 1000 // period) >> 2
+            prev = alloc
+            grown = alloc - last
+            if grown < min(Screen.gc_min_alloc, Screen.gc_idle_alloc):
+                stats['skipped'] += 1
+                continue
+            idle = Screen._idle()
+            if grown < Screen.gc_min_alloc and not idle:
+                stats['skipped'] += 1
+                continue
+            budget = Screen.gc_budget
+            if (budget is not None and stats['last_pause'] > budget and not idle
+                    and gc.mem_free() > stats['rate']):
+                stats['deferred'] += 1
+                continue
+            start = ticks_us()
             gc.collect()
+            pause = ticks_diff(ticks_us(), start)
             gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+            last = prev = gc.mem_alloc()
+            stats['collections'] += 1
+            if idle:
+                stats['idle'] += 1
+            stats['last_pause'] = pause
+            stats['max_pause'] = max(stats['max_pause'], pause)
 
 # Very basic window class. Cuts a rectangular hole in a screen on which content may be drawn
+# If save_under is set the pixels under the window are read when it opens and
+# written back when it closes, so the screen beneath need not be redrawn.
 class Aperture(Screen):
     _value = None
-    def __init__(self, location, height, width, *, draw_border=True, bgcolor=None, fgcolor=None):
+    def __init__(self, location, height, width, *, draw_border=True, bgcolor=None, fgcolor=None,
+                 save_under=False):
         Screen.__init__(self)
         self.location = location
         self.height = height
         self.width = width
         self.draw_border = draw_border
         self.modal = True
+        self.save_under = save_under
+        self.saved = None # Pixels under the window
         tft = Screen.get_tft()
         self.fgcolor = fgcolor if fgcolor is not None else tft.getColor()
         self.bgcolor = bgcolor if bgcolor is not None else tft.getBGColor()
@@ -331,13 +619,20 @@ class Aperture(Screen):
     def locn(self, x, y):
         return (self.location[0] + x, self.location[1] + y)
 
-    def _do_open(self, old_screen):
+    async def _do_open(self, old_screen, whole):
+        if self._uncover(old_screen):
+            return
         tft = Screen.get_tft()
         x, y = self.location[0], self.location[1]
-        tft.fill_rectangle(x, y, x + self.width, y + self.height, self.bgcolor)
-        if self.draw_border:
-            tft.draw_rectangle(x, y, x + self.width, y + self.height, self.fgcolor)
-        Screen.show()
+        # A parent which is not fully drawn is redrawn when this closes
+        if self.save_under and old_screen is self.parent and not old_screen.opening:
+            self._save(tft)
+        await tft.fill_rectangle_async(x, y, x + self.width, y + self.height, self.bgcolor)
+        if Screen.current_screen is self:
+            tft = Screen.get_tft() # Other tasks may have changed greying
+            if self.draw_border:
+                tft.draw_rectangle(x, y, x + self.width, y + self.height, self.fgcolor)
+            Screen.show()
 
     def _list_dims(self):
         x0 = self.location[0]
@@ -346,6 +641,31 @@ class Aperture(Screen):
         y1 = self.location[1] + self.height
         return x0, y0, x1, y1
 
+    def _save_dims(self): # Window clipped to the screen
+        width, height = Screen.tft.getScreensize()
+        x0, y0, x1, y1 = self._list_dims()
+        return max(x0, 0), max(y0, 0), min(x1, width - 1), min(y1, height - 1)
+
+# If there is too little RAM the screen beneath is redrawn on close instead.
+    def _save(self, tft):
+        x0, y0, x1, y1 = self._save_dims()
+        gc.collect()
+        try:
+            buf = bytearray((x1 - x0 + 1) * (y1 - y0 + 1) * 3)
+        except MemoryError:
+            return
+        tft.readArea(x0, y0, x1, y1, buf)
+        self.saved = buf
+
+    def _restore(self):
+        buf = self.saved
+        if buf is None:
+            return False
+        self.saved = None
+        x0, y0, x1, y1 = self._save_dims()
+        Screen.tft.writeArea(x0, y0, x1, y1, buf)
+        return True
+
     @classmethod
     def value(cls, val=None): # Mechanism for testing the outcome of a dialog box
         if val is not None:
@@ -366,6 +686,7 @@ class NoTouch:
         self.width = width
         self.fill = bgcolor is not None
         self.visible = True # Used by ButtonList class for invisible buttons
+        self.dirty = False # Awaiting redraw by Screen._render
         self._greyed_out = False # Disabled by user code
         tft = Screen.get_tft(False) # Not greyed out
         self.fgcolor = fgcolor if fgcolor is not None else tft.getColor()
@@ -399,8 +720,14 @@ class NoTouch:
             self.show_if_current()
 
     def show_if_current(self):
-        if self.screen is Screen.current_screen:
-            self.show()
+        screen = self.screen
+        if screen is Screen.current_screen and not screen.opening:
+            if Screen.deferred:
+                Screen.invalidate(self)
+            else:
+                self.show()
+        else:
+            self.dirty = True # Drawn when the screen is uncovered or shown
 
 # Called by Screen.show(). Draw background and bounding box if required
     def draw_border(self):
@@ -5,8 +5,9 @@
 # Released under the MIT License (MIT). See LICENSE.
 # Copyright (c) 2016-2020 Peter Hinch
 
-import math
 from tft.driver.ugui import NoTouch
+from tft.driver import trig
+from tft.driver.sprite import LineSprite
 from tft.driver.constants import *
 
 # class displays angles. Angle 0 is vertical, +ve increments are clockwise.
@@ -20,43 +21,59 @@ class Dial(NoTouch):
         self.xorigin = location[0] + border + radius
         self.yorigin = location[1] + border + radius
         self.pointers = tuple(z * self.radius for z in pointers) # Pointer lengths
-        self.angles = [None for _ in pointers]
-        self.new_value = None
+        self.sprites = tuple(LineSprite(length) for length in self.pointers)
+        self.lengths = tuple(trig.fixlen(length) for length in self.pointers)
+        self.xf = trig.fix(self.xorigin) # Fixed point geometry: see trig.py
+        self.yf = trig.fix(self.yorigin)
+        self.angles = [None for _ in pointers] # In trig.TURN units. None: not shown
+        self.pending = 0 # Bit set for each pointer changed since last shown
 
+# Pointers may overlap, so those above the lowest changed pointer are removed
+# in reverse order and redrawn. The static content is only redrawn if required.
     def show(self):
         tft = self.tft
-        ticks = self.ticks
-        radius = self.radius
-        ticklen = 0.1 * radius
-        for tick in range(ticks):
-            theta = 2 * tick * math.pi / ticks
-            x_start = int(self.xorigin + radius * math.sin(theta))
-            y_start = int(self.yorigin - radius * math.cos(theta))
-            x_end = int(self.xorigin + (radius - ticklen) * math.sin(theta))
-            y_end = int(self.yorigin - (radius - ticklen) * math.cos(theta))
-            tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
-        tft.draw_circle(self.xorigin, self.yorigin, radius, self.fgcolor)
-        for idx, ang in enumerate(self.angles):
-            if ang is not None:
-                self._drawpointer(ang, idx, self.bgcolor) # erase old
-        if self.new_value is not None:
-            self.angles[self.new_value[1]] = self.new_value[0]
-            self.new_value = None
+        sprites = self.sprites
+        first = 0
+        if not self.redraw:
+            while first < len(sprites) and not self.pending & (1 << first):
+                first += 1
+        self.pending = 0
+        for idx in range(len(sprites) - 1, first - 1, -1):
+            if self.redraw: # Pixels saved under the pointers are stale
+                sprites[idx].erase(tft, self.bgcolor)
+            else:
+                sprites[idx].hide(tft)
+        if self.redraw:
+            self.redraw = False
+            ticks = self.ticks
+            radius = self.radius
+            ticklen = 0.1 * radius
+            r0 = trig.fixlen(radius)
+            r1 = trig.fixlen(radius - ticklen)
+            for tick in range(ticks):
+                theta = tick * trig.TURN // ticks
+                x_start = trig.endx(self.xf, r0, theta)
+                y_start = trig.endy(self.yf, r0, theta)
+                x_end = trig.endx(self.xf, r1, theta)
+                y_end = trig.endy(self.yf, r1, theta)
+                tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
+            tft.draw_circle(self.xorigin, self.yorigin, radius, self.fgcolor)
 
-        for idx, ang in enumerate(self.angles):
+        for idx in range(first, len(sprites)):
+            ang = self.angles[idx]
             if ang is not None:
-                self._drawpointer(ang, idx, self.fgcolor)
+                self._drawpointer(tft, ang, idx, self.fgcolor)
 
     def value(self, angle, pointer=0):
-        if pointer > len(self.pointers):
+        if pointer >= len(self.pointers):
             raise ValueError('pointer index out of range')
-        self.new_value = [angle, pointer]
+        self.angles[pointer] = None if angle is None else trig.angle(angle)
+        self.pending |= 1 << pointer
         self.show_if_current()
 
-    def _drawpointer(self, radians, pointer, color):
-        tft = self.tft
-        length = self.pointers[pointer]
-        x_end = int(self.xorigin + length * math.sin(radians))
-        y_end = int(self.yorigin - length * math.cos(radians))
-        tft.draw_line(int(self.xorigin), int(self.yorigin), x_end, y_end, color)
+    def _drawpointer(self, tft, angle, pointer, color):
+        length = self.lengths[pointer]
+        x_end = trig.endx(self.xf, length, angle)
+        y_end = trig.endy(self.yf, length, angle)
+        self.sprites[pointer].move(tft, int(self.xorigin), int(self.yorigin), x_end, y_end, color)
 
@@ -13,7 +13,7 @@ from tft.widgets.buttons import Button
 
 class DialogBox(Aperture):
     def __init__(self, font, *, elements, location=(20, 20), label=None,
-                 bgcolor=DARKGREEN, buttonwidth=25, closebutton=True):
+                 bgcolor=DARKGREEN, buttonwidth=25, closebutton=True, save_under=False):
         height = 150
         spacing = 20
         buttonwidth = max(max([get_stringsize(x[0], font)[0] for x in elements]) + 4, buttonwidth)
@@ -22,7 +22,7 @@ class DialogBox(Aperture):
         width = spacing + (buttonwidth + spacing) * nelements
         if label is not None:
             width = max(width, get_stringsize(label, font)[0] + 2 * spacing)
-        super().__init__(location, height, width, bgcolor = bgcolor)
+        super().__init__(location, height, width, bgcolor = bgcolor, save_under = save_under)
         x = self.location[0] + spacing # Coordinates relative to physical display
         gap = 0
         if nelements > 1:
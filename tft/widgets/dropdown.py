@@ -20,14 +20,15 @@ class _ListDialog(Aperture):
         font = dd.font
         elements = dd.elements
         entry_height = font.height() + 2 # Allow a pixel above and below text
-        height = entry_height * len(elements) + 2 * border
+        nrows = len(elements) if dd.nrows is None else min(max(dd.nrows, 1), len(elements))
+        height = entry_height * nrows + 2 * border
         lb_location = location[0] + border, location[1] + border
         lb_width = width - 2 * border
-        super().__init__(location, height, width)
+        super().__init__(location, height, width, save_under = dd.save_under)
         self.listbox = Listbox(lb_location, font = font, elements = elements, width = lb_width,
                                border = None, fgcolor = dd.fgcolor, bgcolor = dd.bgcolor,
                                fontcolor = dd.fontcolor, select_color = dd.select_color,
-                               value = dd.value(), callback = self.callback)
+                               value = dd.value(), callback = self.callback, nrows = nrows)
         self.dropdown = dd
 
     def callback(self, obj_listbox):
@@ -40,7 +41,7 @@ class _ListDialog(Aperture):
 class Dropdown(Touchable):
     def __init__(self, location, *, font, elements, width=250, value=0,
                  fgcolor=None, bgcolor=None, fontcolor=None, select_color=LIGHTBLUE,
-                 callback=dolittle, args=[]):
+                 callback=dolittle, args=[], save_under=False, nrows=None):
         border = 2
         self.entry_height = font.height() + 2 # Allow a pixel above and below text
         height = self.entry_height + 2 * border
@@ -48,6 +49,8 @@ class Dropdown(Touchable):
         super()._set_callbacks(callback, args)
         self.select_color = select_color
         self.elements = elements
+        self.save_under = save_under
+        self.nrows = nrows
 
     def show(self):
         tft = self.tft
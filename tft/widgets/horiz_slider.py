@@ -1,5 +1,5 @@
 from tft.driver.ugui import Touchable, dolittle, get_stringsize
-from tft.driver import TFT_io
+from tft.driver.sprite import RectSprite
 # horiz_slider.py For TFT driver.
 # Adapted for (and requires) uasyncio V3
 
@@ -22,15 +22,12 @@ class HorizSlider(Touchable):
         slideheight = int(height / 1.3) & 0xfe # Ensure divisible by 2
         self.slidewidth = 6 # must be divisible by 2
                              # We draw an odd number of pixels:
-        self.slidebytes = (slideheight + 1) * (self.slidewidth + 1) * 3
-        self.slidebuf = bytearray(self.slidebytes)
+        self.sprite = RectSprite(self.slidewidth + 1, slideheight + 1)
         b = self.border
         self.pot_dimension = self.width - 2 * (b + self.slidewidth // 2)
         height = self.height - 2 * b
         ycentre = self.location[1] + b + height // 2
-        self.slide_y0 = ycentre - slideheight // 2
-        self.slide_y1 = ycentre + slideheight // 2 # slide Y coordinates
-        self.slide_x = None # invalidate: slide has not yet been drawn
+        self.slide_y0 = ycentre - slideheight // 2 # slide Y coordinate
         # Prevent Label objects being added to display list when already there.
         self.drawn = False
 
@@ -43,7 +40,7 @@ class HorizSlider(Touchable):
         y = self.location[1] + bw
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
-            self.render_slide(tft, self.bgcolor) # Erase slide if it exists
+            self.sprite.erase(tft, self.bgcolor) # Erase slide if it exists
             dy = height // 2 - 2 # slot is 4 pixels wide
             tft.draw_rectangle(x, y + dy, x + width, y + height - dy, self.fgcolor)
             if self.divisions > 0:
@@ -66,15 +63,11 @@ class HorizSlider(Touchable):
                     loc = int(xl - offset), y - self.font.height() - bw - 1
                     Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
                     xl += dx
-            self.save_background(tft)
             if self._value is None:
                 self.value(self._initial_value, show = False) # prevent recursion
 
-        self.render_bg(tft)
-        self.slide_x = self.update(tft) # Reflect new value in slider position
-        self.save_background(tft)
         color = self.slidecolor if self.slidecolor is not None else self.fgcolor
-        self.render_slide(tft, color)
+        self.sprite.move(tft, self.update(tft), self.slide_y0, color) # Reflect new value
         self.drawn = True
 
     def update(self, tft):
@@ -82,23 +75,6 @@ class HorizSlider(Touchable):
         sliderpos = int(x + self._value * self.pot_dimension)
         return sliderpos - self.slidewidth // 2
 
-    def slide_coords(self):
-        return self.slide_x, self.slide_y0, self.slide_x + self.slidewidth, self.slide_y1
-
-    def save_background(self, tft): # Read background under slide
-        if self.slide_x is not None:
-            tft.setXY(*self.slide_coords())
-            TFT_io.tft_read_cmd_data_AS(0x2e, self.slidebuf, self.slidebytes)
-
-    def render_bg(self, tft):
-        if self.slide_x is not None:
-            tft.setXY(*self.slide_coords())
-            TFT_io.tft_write_data_AS(self.slidebuf, self.slidebytes)
-
-    def render_slide(self, tft, color):
-        if self.slide_x is not None:
-            tft.fill_rectangle(*self.slide_coords(), color = color)
-
     def color(self, color):
         if color != self.fgcolor:
             self.fgcolor = color
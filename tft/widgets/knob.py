@@ -4,8 +4,8 @@
 # Released under the MIT License (MIT). See LICENSE.
 # Copyright (c) 2016-2020 Peter Hinch
 
-import math
 from tft.driver.ugui import Touchable, dolittle, TWOPI
+from tft.driver import trig
 from tft.driver.constants import *
 
 # *********** CONTROL KNOB CLASS ***********
@@ -24,24 +24,35 @@ class Knob(Touchable):
         self.ticklen = 0.1 * radius
         self.pointerlen = radius - self.ticklen - 5
         self.ticks = max(ticks, 2) # start and end of travel
+        # Fixed point geometry: see trig.py
+        self.arc_a = trig.angle(self.arc)
+        self.xf = trig.fix(self.xorigin)
+        self.yf = trig.fix(self.yorigin)
+        self.plen = trig.fixlen(self.pointerlen)
+        self.x2 = int(2 * self.xorigin) # Origin in half pixels for touch
+        self.y2 = int(2 * self.yorigin)
+        self.rmin2 = int(2 * radius * radius) # Minimum touch vector in half pixels, squared
         super()._set_callbacks(cb_move, cbm_args, cb_end, cbe_args)
-        self._old_value = None # data: invalidate
+        self._angle = 0 # Pointer angle in trig units: set from value
+        self._old_angle = None # data: invalidate
         self.color = color
 
     def show(self):
         tft = self.tft
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
-            arc = self.arc
+            arc = self.arc_a
             ticks = self.ticks
             radius = self.radius
             ticklen = self.ticklen
+            r0 = trig.fixlen(radius)
+            r1 = trig.fixlen(radius - ticklen)
             for tick in range(ticks):
-                theta = (tick / (ticks - 1)) * arc - arc / 2
-                x_start = int(self.xorigin + radius * math.sin(theta))
-                y_start = int(self.yorigin - radius * math.cos(theta))
-                x_end = int(self.xorigin + (radius - ticklen) * math.sin(theta))
-                y_end = int(self.yorigin - (radius - ticklen) * math.cos(theta))
+                theta = tick * arc // (ticks - 1) - arc // 2
+                x_start = trig.endx(self.xf, r0, theta)
+                y_start = trig.endy(self.yf, r0, theta)
+                x_end = trig.endx(self.xf, r1, theta)
+                y_end = trig.endy(self.yf, r1, theta)
                 tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
             if self.color is not None:
                 tft.fill_circle(self.xorigin, self.yorigin, radius - ticklen, self.color)
@@ -50,34 +61,37 @@ class Knob(Touchable):
             if self._value is None:
                 self.value(self._initial_value, show = False)
 
-        if self._old_value is not None: # An old pointer needs erasing
+        if self._old_angle is not None: # An old pointer needs erasing
             if self.greyed_out() and tft.skeleton():
                 tft.usegrey(False) # greyed out 'skeleton' style
                 color = tft.getBGColor() # erase to screen background
             else:
                 color = self.bgcolor if self.color is None else self.color # Fill color
-            self._drawpointer(self._old_value, color) # erase old
+            self._drawpointer(self._old_angle, color) # erase old
             self.tft # Reset Screen greyed-out status
 
-        self._drawpointer(self._value, self.fgcolor) # draw new
-        self._old_value = self._value # update old
+        self._drawpointer(self._angle, self.fgcolor) # draw new
+        self._old_angle = self._angle # update old
+
+    def _value_change(self, show): # Convert the value to an angle once only
+        arc = self.arc_a
+        self._angle = round(self._value * arc) - (arc >> 1)
+        super()._value_change(show)
 
     def _touched(self, x, y): # Touched in bounding box. A drag will call repeatedly.
-        dy = self.yorigin - y
-        dx = x - self.xorigin
-        if (dx**2 + dy**2) / self.radius**2 < 0.5:
+        dy = self.y2 - 2 * y
+        dx = 2 * x - self.x2
+        if dx * dx + dy * dy < self.rmin2:
             return # vector too short
-        alpha = math.atan2(dx, dy) # axes swapped: orientate relative to vertical
-        arc = self.arc
-        alpha = min(max(alpha, -arc / 2), arc / 2) + arc / 2
-        self.value(alpha / arc)
+        alpha = trig.atan2(dx, dy) # axes swapped: orientate relative to vertical
+        half = self.arc_a >> 1
+        alpha = min(max(alpha, -half), half)
+        if alpha != self._angle: # A float value is only created on a change
+            self.value((alpha + half) / self.arc_a)
 
-    def _drawpointer(self, value, color):
+    def _drawpointer(self, angle, color):
         tft = self.tft
-        arc = self.arc
-        length = self.pointerlen
-        angle = value * arc - arc / 2
-        x_end = int(self.xorigin + length * math.sin(angle))
-        y_end = int(self.yorigin - length * math.cos(angle))
+        x_end = trig.endx(self.xf, self.plen, angle)
+        y_end = trig.endy(self.yf, self.plen, angle)
         tft.draw_line(int(self.xorigin), int(self.yorigin), x_end, y_end, color)
 
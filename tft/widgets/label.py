@@ -4,24 +4,73 @@
 # Released under the MIT License (MIT). See LICENSE.
 # Copyright (c) 2016-2020 Peter Hinch
 
-from tft.driver.ugui import NoTouch, get_stringsize, print_left
+from tft.driver.ugui import NoTouch, get_stringsize
+from tft.driver.tft import char_widths
 from tft.driver.constants import *
 
+# Text is drawn opaque in the background color so a glyph cell may be
+# overwritten without blanking. The string on display and the x offsets of its
+# glyphs are retained: when the value changes only glyph cells which differ are
+# drawn, and any pixels beyond the end of a shorter string are cleared.
 class Label(NoTouch):
     def __init__(self, location, *, font, border=None, width=None, fgcolor=None, bgcolor=None, fontcolor=None, value=None):
         if width is None:
             if value is None:
                 raise ValueError('If label value unspecified, must define the width')
-            width, _ = get_stringsize(value, font) 
+            width, _ = get_stringsize(value, font)
         super().__init__(location, font, None, width, fgcolor, bgcolor, fontcolor, border, value, None)
         self.height = self.font.height()
         self.height += 2 * self.border  # Height determined by font and border
+        self.drawn = None # (string, offsets) on display
 
     def show(self):
         tft = self.tft
         bw = self.border
-        x = self.location[0]
-        y = self.location[1]
-        tft.fill_rectangle(x + bw, y + bw, x + self.width - bw, y + self.height - bw, self.bgcolor)
-        if self._value is not None:
-            print_left(tft, x + bw, y + bw, self._value, self.fontcolor, self.font, self.width - 2 * bw)
+        x = self.location[0] + bw
+        y = self.location[1] + bw
+        xe = self.location[0] + self.width - bw # End of text field
+        style = tft.getTextStyle()
+        text = self._value if self._value is not None else ''
+        offs = self._offsets(text, xe - x, style[4])
+        n = len(offs) - 1 # Glyphs which fit
+        tft.setTextStyle(self.fontcolor, self.bgcolor, 0, self.font)
+        if self.redraw or self.drawn is None:
+            self.redraw = False
+            tft.fill_rectangle(x, y, xe, y + self.height - 2 * bw, self.bgcolor)
+            self._print(tft, text, 0, n, offs, x, y, xe)
+        else:
+            old, old_offs = self.drawn
+            m = len(old_offs) - 1
+            start = None # Start of a run of changed glyphs
+            for i in range(n + 1):
+                if i < n and not (i < m and old[i] == text[i] and old_offs[i] == offs[i]):
+                    if start is None:
+                        start = i
+                elif start is not None:
+                    self._print(tft, text, start, i, offs, x, y, xe)
+                    start = None
+            if old_offs[m] > offs[n]: # Clear the rest of the old string
+                tft.fill_rectangle(x + offs[n], y, x + old_offs[m] - 1, y + self.font.height() - 1, self.bgcolor)
+        tft.setTextStyle(*style)
+        self.drawn = (text, offs)
+
+    def _print(self, tft, text, start, end, offs, x, y, xe):
+        if end > start:
+            tft.setTextPos(x + offs[start], y, xe - x - offs[start], False)
+            tft.printString(text[start : end])
+
+# x offsets of the glyphs of s which fit in the clip width, followed by the end
+# of the last one. Matches the placement of TFT.printString.
+    def _offsets(self, s, clip, gap):
+        font = self.font
+        widths = char_widths(font)
+        offs = [0]
+        x = 0
+        for c in s:
+            idx = ord(c) - 32
+            cols = widths[idx] if 0 <= idx < 95 else font.get_ch(c)[2]
+            if x + cols > clip:
+                break
+            x += cols + gap
+            offs.append(x)
+        return offs
@@ -5,48 +5,70 @@
 # Copyright (c) 2016-2020 Peter Hinch
 
 from tft.driver.ugui import Touchable, dolittle, print_left
+from tft.driver.tft import LANDSCAPE
 from tft.driver.constants import *
 
+_SCROLLBAR = const(8) # Width of scrollbar
+
 # *********** LISTBOX CLASS ***********
 
+# If nrows is less than the number of elements only nrows entries are shown and
+# only those are drawn. The list scrolls when dragged or when its scrollbar is
+# touched. If the listbox spans the width of a landscape display, scrolling by
+# less than a page uses the controller's hardware scroll: rows on screen are
+# moved by the panel and only the rows exposed are drawn. Display memory is then
+# out of order, so the Screen calls _unscroll() before anything overlays it.
 class Listbox(Touchable):
     def __init__(self, location, *, font, elements, width=250, value=0, border=2,
                  fgcolor=None, bgcolor=None, fontcolor=None, select_color=LIGHTBLUE,
-                 callback=dolittle, args=[]):
-        self.entry_height = font.height() + 2 # Allow a pixel above and below text
-        bw = border if border is not None else 0 # Replicate Touchable ctor's handling of self.border
-        height = self.entry_height * len(elements) + 2 * bw
-        super().__init__(location, font, height, width, fgcolor, bgcolor, fontcolor, border, False, value, None)
-        super()._set_callbacks(callback, args)
-        self.select_color = select_color
+                 callback=dolittle, args=[], nrows=None):
         fail = False
         try:
-            self.elements = [s for s in elements if type(s) is str]
+            # A list of strings is not copied: it may be long
+            strings = elements if all(type(s) is str for s in elements) else [s for s in elements if type(s) is str]
         except:
             fail = True
         else:
-            fail = len(self.elements) == 0
+            fail = len(strings) == 0
         if fail:
             raise ValueError('elements must be a list or tuple of one or more strings')
-        if value >= len(self.elements):
+        self.entry_height = font.height() + 2 # Allow a pixel above and below text
+        bw = border if border is not None else 0 # Replicate Touchable ctor's handling of self.border
+        length = len(strings)
+        self.nrows = length if nrows is None else min(max(nrows, 1), length)
+        height = self.entry_height * self.nrows + 2 * bw
+        super().__init__(location, font, height, width, fgcolor, bgcolor, fontcolor, border,
+                         self.nrows < length, value, None)
+        super()._set_callbacks(callback, args)
+        self.select_color = select_color
+        self.elements = strings
+        if value >= length:
             value = 0
         self._value = value # No callback until user touches
+        self.top = 0 # Index of first visible entry
+        self.shown = None # (top, value) on display
+        self.offset = 0 # Rows moved by hardware scroll
+        self.drag = None # (y, top) at start of a touch
+        self._make_visible(value)
 
     def show(self):
         tft = self.tft
+        if self.redraw:
+            self.redraw = False
+            self._claim(tft)
+        elif self.shown is not None and self._update(tft):
+            return
         bw = self.border
-        clip = self.width - 2 * bw
-        length = len(self.elements)
         x = self.location[0]
         y = self.location[1]
         xs = x + bw # start and end of text field
         xe = x + self.width - 2 * bw
-        tft.fill_rectangle(xs, y + 1, xe, y - 1 + self.height - 2 * bw, self.bgcolor)
-        for n in range(length):
-            ye = y + n * self.entry_height
-            if n == self._value:
-                tft.fill_rectangle(xs, ye + 1, xe, ye + self.entry_height - 1, self.select_color)
-            print_left(tft, xs, ye + 1, self.elements[n], self.fontcolor, self.font, clip)
+        ye = y + self.nrows * self.entry_height # Last row of scroll area
+        self._fill(tft, xs, y + 1, xe, ye if self.screen.scroller is self else ye - 1, self.bgcolor)
+        for slot in range(self.nrows):
+            self._draw_row(tft, slot, False)
+        self._draw_scrollbar(tft)
+        self.shown = (self.top, self._value)
 
     def textvalue(self, text=None): # if no arg return current text
         if text is None:
@@ -61,12 +83,157 @@ class Listbox(Touchable):
                     self.value(v)
             return v
 
+    def _value_change(self, show):
+        self._make_visible(self._value)
+        super()._value_change(show)
+
+    def _make_visible(self, n): # Scroll so that entry n is shown
+        if n < self.top:
+            self.top = n
+        elif n >= self.top + self.nrows:
+            self.top = n - self.nrows + 1
+
     def _touched(self, x, y):
-        dy = y - (self.location[1])
-        self._initial_value = dy // self.entry_height
+        slot = min((y - self.location[1]) // self.entry_height, self.nrows - 1)
+        if not self.can_drag:
+            self._initial_value = slot
+            return
+        if not self.busy: # Start of touch
+            self.drag = (y, self.top)
+            self._initial_value = self.top + slot
+        ys, top = self.drag
+        if x > self.location[0] + self.width - 2 * self.border - _SCROLLBAR: # Scrollbar
+            top = (y - self.location[1]) * (len(self.elements) - self.nrows) // (self.nrows * self.entry_height)
+            self._initial_value = None
+        elif self._initial_value is None or abs(y - ys) >= self.entry_height:
+            top -= int((y - ys) / self.entry_height) # Drag list
+            self._initial_value = None
+        self._goto(top)
 
     def _untouched(self):
+        self.drag = None
         if self._initial_value is not None:
             self._value = -1  # Force update on every touch
             self.value(self._initial_value, show = True)
             self._initial_value = None
+
+    def _goto(self, top): # Scroll to show entry top first
+        top = min(max(top, 0), len(self.elements) - self.nrows)
+        if top != self.top:
+            self.top = top
+            self.show_if_current()
+
+    def _unscroll(self, redraw): # Restore the default scroll area
+        tft = self.tft
+        if self.offset:
+            self.offset = 0
+            self.shown = None
+            tft.setScrollStart(self.location[1] + 1)
+            if redraw:
+                self.show()
+        h = tft.getScreensize()[1]
+        tft.setScrollArea(0, h, 0)
+        self.screen.scroller = None
+
+# Take the hardware scroll area if a scroll of less than a page can be done by
+# the panel. Sets the area so that display memory is in order.
+    def _claim(self, tft):
+        self.offset = 0
+        screen = self.screen
+        if screen.scroller is self:
+            screen.scroller = None
+        if not self.can_drag or self.nrows < 2 or screen.scroller is not None:
+            return
+        w, h = tft.getScreensize()
+        x = self.location[0]
+        y = self.location[1]
+        vsa = self.nrows * self.entry_height
+        if tft.orientation == LANDSCAPE and x <= 0 and x + self.width >= w - 1 and y >= 0 and y + 1 + vsa <= h:
+            tft.setScrollArea(y + 1, vsa, h - y - 1 - vsa)
+            screen.scroller = self
+            bw = self.border # Last row will scroll into view
+            tft.fill_rectangle(x + bw, y + vsa, x + self.width - 2 * bw, y + vsa, self.bgcolor)
+
+# Bring the display up to date by scrolling and by repainting the rows whose
+# highlight has changed. Fails if the visible rows must be redrawn.
+    def _update(self, tft):
+        top, value = self.shown
+        if top != self.top and not self._scroll(tft, self.top - top):
+            return False
+        if value != self._value:
+            for n in (value, self._value):
+                if 0 <= n - self.top < self.nrows:
+                    self._draw_row(tft, n - self.top)
+        self.shown = (self.top, self._value)
+        return True
+
+# Scroll by delta rows in hardware, drawing only the exposed rows. Fails if
+# this is not possible.
+    def _scroll(self, tft, delta):
+        screen = self.screen
+        if abs(delta) >= self.nrows:
+            return False
+        if screen.scroller is None and not self.offset: # Area was released by _unscroll
+            self._claim(tft)
+        if screen.scroller is not self:
+            return False
+        self.offset = (self.offset + delta) % self.nrows
+        tft.scroll(delta * self.entry_height)
+        rows = range(self.nrows - delta, self.nrows) if delta > 0 else range(-delta)
+        for slot in rows:
+            self._draw_row(tft, slot)
+        self._draw_scrollbar(tft)
+        return True
+
+# Draw the entry in a visible row. Text is placed by the TFT's scroll mapping;
+# fills are mapped by _fill.
+    def _draw_row(self, tft, slot, blank=True):
+        n = self.top + slot
+        eh = self.entry_height
+        bw = self.border
+        xs = self.location[0] + bw
+        xe = self.location[0] + self.width - 2 * bw
+        clip = self.width - 2 * bw
+        if self.can_drag:
+            xe -= _SCROLLBAR
+            clip = xe - xs
+        ye = self.location[1] + slot * eh
+        if n == self._value:
+            self._fill(tft, xs, ye + 1, xe, ye + eh - 1, self.select_color)
+        elif blank:
+            self._fill(tft, xs, ye + 1, xe, ye + eh - 1, self.bgcolor)
+        if blank and self.screen.scroller is self: # Last row may be exposed
+            self._fill(tft, xs, ye + eh, xe, ye + eh, self.bgcolor)
+        print_left(tft, xs, ye + 1, self.elements[n], self.fontcolor, self.font, clip)
+
+    def _draw_scrollbar(self, tft):
+        if not self.can_drag:
+            return
+        x1 = self.location[0] + self.width - 2 * self.border
+        x0 = x1 - _SCROLLBAR + 1
+        y0 = self.location[1] + 1
+        h = self.nrows * self.entry_height - 1
+        n = len(self.elements)
+        th = max(h * self.nrows // n, 6) # Thumb height
+        ty = y0 + (h - th) * self.top // (n - self.nrows)
+        y1 = y0 + h if self.screen.scroller is self else y0 + h - 1
+        self._fill(tft, x0, y0, x1, ty - 1, self.bgcolor)
+        self._fill(tft, x0, ty, x1, ty + th - 1, self.fgcolor)
+        self._fill(tft, x0, ty + th, x1, y1, self.bgcolor)
+
+# Fill a rectangle given in screen coordinates. When the display is scrolled in
+# hardware rows are mapped to display memory, splitting the fill if it wraps.
+    def _fill(self, tft, x0, y0, x1, y1, color):
+        if y1 < y0:
+            return
+        if self.offset:
+            tfa = self.location[1] + 1
+            vsa = self.nrows * self.entry_height
+            m0 = tfa + (y0 - tfa + self.offset * self.entry_height) % vsa
+            n = y1 - y0 + 1
+            first = min(n, tfa + vsa - m0)
+            tft.fill_rectangle(x0, m0, x1, m0 + first - 1, color)
+            if n > first:
+                tft.fill_rectangle(x0, tfa, x1, tfa + n - first - 1, color)
+        else:
+            tft.fill_rectangle(x0, y0, x1, y1, color)
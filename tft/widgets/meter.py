@@ -5,7 +5,7 @@
 # Copyright (c) 2016-2020 Peter Hinch
 
 from tft.driver.ugui import NoTouch, print_centered
-from tft.driver import TFT_io
+from tft.driver.sprite import RectSprite
 from tft.driver.constants import *
 
 class Meter(NoTouch):
@@ -15,8 +15,7 @@ class Meter(NoTouch):
         border = 5 if font is None else 1 + font.height() / 2
         NoTouch.__init__(self, location, font, height, width, fgcolor, bgcolor, fontcolor, border, value, None) # super() provoked Python bug
         border = self.border # border width
-        self.ptrbytes = 3 * (self.width + 1) # 3 bytes per pixel
-        self.ptrbuf = bytearray(self.ptrbytes) #???
+        self.sprite = RectSprite(self.width, 1) # Pointer
         self.x0 = self.location[0]
         self.x1 = self.location[0] + self.width
         self.y0 = self.location[1] + border + 2
@@ -24,11 +23,20 @@ class Meter(NoTouch):
         self.divisions = divisions
         self.legends = legends
         self.pointercolor = pointercolor if pointercolor is not None else self.fgcolor
-        self.ptr_y = None # Invalidate old position
 
     def show(self):
         tft = self.tft
-        width = self.width
+        if self.redraw: # Screen was cleared or overlaid: pointer must be redrawn
+            self.redraw = False
+            # The background, including the border which the pointer crosses,
+            # has been repainted: pixels saved under the pointer are stale.
+            self.sprite.discard()
+            self._draw_static(tft)
+        # Restore background under old pointer and draw new one. The sprite
+        # preserves tick marks and legends which it covers.
+        self.sprite.move(tft, self.x0, int(self.y1 - self._value * (self.y1 - self.y0)), self.pointercolor)
+
+    def _draw_static(self, tft): # Tick marks and legends
         dx = 5
         x0 = self.x0
         x1 = self.x1
@@ -51,12 +59,3 @@ class Meter(NoTouch):
             for legend in self.legends:
                 print_centered(tft, int(self.x0 + self.width /2), int(yl), legend, self.fontcolor, self.font)
                 yl -= dy
-
-        if self.ptr_y is not None: # Restore background if it was saved
-            tft.setXY(x0, self.ptr_y, x1, self.ptr_y)
-            TFT_io.tft_write_data_AS(self.ptrbuf, self.ptrbytes)
-        self.ptr_y = int(self.y1 - self._value * height) # y position of slider
-        tft.setXY(x0, self.ptr_y, x1, self.ptr_y) # Read background
-        TFT_io.tft_read_cmd_data_AS(0x2e, self.ptrbuf, self.ptrbytes)
-        tft.draw_hline(x0, self.ptr_y, width, self.pointercolor) # Draw pointer
-
@@ -5,7 +5,7 @@
 # Copyright (c) 2016-2020 Peter Hinch
 
 from tft.driver.ugui import Touchable, dolittle
-from tft.driver import TFT_io
+from tft.driver.sprite import RectSprite
 from tft.driver.constants import *
 from tft.widgets.label import Label
 # A slider's text items lie outside its bounding box (area sensitive to touch)
@@ -23,15 +23,12 @@ class Slider(Touchable):
         slidewidth = int(width / 1.3) & 0xfe # Ensure divisible by 2
         self.slideheight = 6 # must be divisible by 2
                              # We draw an odd number of pixels:
-        self.slidebytes = (self.slideheight + 1) * (slidewidth + 1) * 3
-        self.slidebuf = bytearray(self.slidebytes)
+        self.sprite = RectSprite(slidewidth + 1, self.slideheight + 1)
         b = self.border
         self.pot_dimension = self.height - 2 * (b + self.slideheight // 2)
         width = self.width - 2 * b
         xcentre = self.location[0] + b + width // 2
-        self.slide_x0 = xcentre - slidewidth // 2
-        self.slide_x1 = xcentre + slidewidth // 2 # slide X coordinates
-        self.slide_y = None # Invalidate slide position
+        self.slide_x0 = xcentre - slidewidth // 2 # slide X coordinate
         # Prevent Label objects being added to display list when already there.
         self.drawn = False
 
@@ -44,7 +41,7 @@ class Slider(Touchable):
         y = self.location[1] + bw + self.slideheight // 2 # Allow space above and below slot
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
-            self.render_slide(tft, self.bgcolor) # Erase slide if it exists
+            self.sprite.erase(tft, self.bgcolor) # Erase slide if it exists
             dx = width // 2 - 2 
             tft.draw_rectangle(x + dx, y, x + width - dx, y + height, self.fgcolor)
             if self.divisions > 0:
@@ -67,14 +64,10 @@ class Slider(Touchable):
                     loc = (x + self.width, int(yl - fhdelta))
                     Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
                     yl -= dy
-            self.save_background(tft)
             if self._value is None:
                 self.value(self._initial_value, show = False) # Prevent recursion
-        self.render_bg(tft)
-        self.slide_y = self.update(tft) # Reflect new value in slider position
-        self.save_background(tft)
         color = self.slidecolor if self.slidecolor is not None else self.fgcolor
-        self.render_slide(tft, color)
+        self.sprite.move(tft, self.slide_x0, self.update(tft), color) # Reflect new value
         self.drawn = True
 
     def update(self, tft):
@@ -82,23 +75,6 @@ class Slider(Touchable):
         sliderpos = int(y + self.pot_dimension - self._value * self.pot_dimension)
         return sliderpos - self.slideheight // 2
 
-    def slide_coords(self):
-        return self.slide_x0, self.slide_y, self.slide_x1, self.slide_y + self.slideheight
-
-    def save_background(self, tft): # Read background under slide
-       if self.slide_y is not None:
-           tft.setXY(*self.slide_coords())
-           TFT_io.tft_read_cmd_data_AS(0x2e, self.slidebuf, self.slidebytes)
-
-    def render_bg(self, tft):
-       if self.slide_y is not None:
-           tft.setXY(*self.slide_coords())
-           TFT_io.tft_write_data_AS(self.slidebuf, self.slidebytes)
-
-    def render_slide(self, tft, color):
-        if self.slide_y is not None:
-            tft.fill_rectangle(*self.slide_coords(), color = color)
-
     def color(self, color):
         if color != self.fgcolor:
             self.fgcolor = color
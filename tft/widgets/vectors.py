@@ -3,45 +3,55 @@
 # Released under the MIT License (MIT). See LICENSE.
 # Copyright (c) 2019 Peter Hinch
 
-import cmath
 from tft.driver.ugui import Screen, NoTouch
+from tft.driver import trig
 from tft.driver.constants import *
 
-conj = lambda v : v.real - v.imag * 1j  # Complex conjugate
+# Coordinates and vectors are integers in 1/16 pixel (see trig.fixlen). Vector
+# y components are positive upwards.
 
-# Draw a vector in complex coordinates. Origin and end are complex.
-# End is relative to origin.
-def pline(tft, origin, vec, color):
-    xs, ys = origin.real, origin.imag
-    tft.draw_line(round(xs), round(ys), round(xs + vec.real), round(ys - vec.imag), color)
+# Draw a vector from screen point x, y.
+def pline(tft, x, y, dx, dy, color):
+    tft.draw_line((x + 8) >> 4, (y + 8) >> 4, (x + dx + 8) >> 4, (y - dy + 8) >> 4, color)
 
-# Draw an arrow; origin and vec are complex, scalar lc defines length of chevron.
-# cw and ccw are unit vectors of +-3pi/4 radians for chevrons.
-def arrow(tft, origin, vec, lc, color):
-    ccw = cmath.exp(3j * cmath.pi/4)  # Unit vectors
-    cw = cmath.exp(-3j * cmath.pi/4)
-    length, theta = cmath.polar(vec)
-    uv = cmath.rect(1, theta)  # Unit rotation vector
-    start = -vec
-    if length > 3 * lc:  # If line is long
-        ds = cmath.rect(lc, theta)
-        start += ds  # shorten to allow for length of tail chevrons
-    chev = lc + 0j
-    pline(tft, origin, vec, color)  # Origin to tip
-    pline(tft, origin, start, color)  # Origin to tail
-    pline(tft, origin + conj(vec), chev*ccw*uv, color)  # Tip chevron
-    pline(tft, origin + conj(vec), chev*cw*uv, color)
-    if length > lc:  # Confusing appearance of very short vectors with tail chevron
-        pline(tft, origin + conj(start), chev*ccw*uv, color)  # Tail chevron
-        pline(tft, origin + conj(start), chev*cw*uv, color)
+# Draw an arrow from x, y; scalar lc defines length of chevron in pixels.
+# Chevrons are at +-3pi/4 radians to the vector.
+def arrow(tft, x, y, dx, dy, lc, color):
+    lc = trig.fixlen(lc)
+    l2 = dx * dx + dy * dy # Squared length
+    theta = trig.atan2(dy, dx)
+    sx = -dx # Tail
+    sy = -dy
+    if l2 > 9 * lc * lc:  # If line is long
+        sx += lc * trig.cos(theta) >> 14  # shorten to allow for length of tail chevrons
+        sy += lc * trig.sin(theta) >> 14
+    ccw = theta + 3 * trig.TURN // 8
+    cw = theta - 3 * trig.TURN // 8
+    cx0 = lc * trig.cos(ccw) >> 14  # Chevrons
+    cy0 = lc * trig.sin(ccw) >> 14
+    cx1 = lc * trig.cos(cw) >> 14
+    cy1 = lc * trig.sin(cw) >> 14
+    pline(tft, x, y, dx, dy, color)  # Origin to tip
+    pline(tft, x, y, sx, sy, color)  # Origin to tail
+    pline(tft, x + dx, y - dy, cx0, cy0, color)  # Tip chevron
+    pline(tft, x + dx, y - dy, cx1, cy1, color)
+    if l2 > lc * lc:  # Confusing appearance of very short vectors with tail chevron
+        pline(tft, x + sx, y - sy, cx0, cy0, color)  # Tail chevron
+        pline(tft, x + sx, y - sy, cx1, cy1, color)
 
-# Vector display
+# Vector display. A value change is drawn by the VectorDial's show method, so
+# with damage tracking only the latest value is drawn in each frame.
 class Pointer:
     def __init__(self, dial):
         dial.vectors.add(self)
         self.dial = dial
         self.color = BLACK  # SYS_FGCOLOR
         self.val = 0j
+        self.x = 0  # Value scaled by trig.ONE
+        self.y = 0
+        self.shown = False  # Drawn at sx, sy
+        self.sx = 0
+        self.sy = 0
 
     def value(self, v=None, color=None):
         if isinstance(color, tuple):
@@ -49,34 +59,35 @@ class Pointer:
         dial = self.dial
         if v is not None:
             if isinstance(v, complex):
-                l = cmath.polar(v)[0]
+                l = abs(v)
                 newval = v /l if l > 1 else v  # Max length = 1.0
             else:
                 raise ValueError('Pointer value must be complex.')
-            if v != self.val and dial.screen is Screen.current_screen:
-                self.show(newval)
             self.val = newval
+            self.x = int(newval.real * trig.ONE)
+            self.y = int(newval.imag * trig.ONE)
             dial.show_if_current()
         return self.val
 
-    def show(self, newval=None):
+    def erase(self):  # Remove from the display if the value has changed
+        if self.shown and (self.sx != self.x or self.sy != self.y):
+            self._draw(self.sx, self.sy, self.dial.bgcolor)
+            self.shown = False
+
+    def show(self):
+        self._draw(self.x, self.y, self.color)
+        self.shown = True
+        self.sx = self.x
+        self.sy = self.y
+
+    def _draw(self, x, y, color):
         dial = self.dial
         tft = dial.tft
-        color = self.color
-        vor = dial.vor  # Dial's origin as a vector
-        r = dial.radius * (1 - dial.TICKLEN)
+        r = dial.rlen  # Length of a unit vector
         if dial.arrow:
-            if newval is None:  # Refresh
-                arrow(tft, vor, r * self.val, 5, color)
-            else:
-                arrow(tft, vor, r * self.val, 5, dial.bgcolor)
-                arrow(tft, vor, r * newval, 5, color)
+            arrow(tft, dial.xo, dial.yo, r * x >> 14, r * y >> 14, 5, color)
         else:
-            if newval is None:  # Refresh
-                pline(tft, vor, r * self.val, color)
-            else:
-                pline(tft, vor, r * self.val, dial.bgcolor)  # Erase old
-                pline(tft, vor, r * newval, color)
+            pline(tft, dial.xo, dial.yo, r * x >> 14, r * y >> 14, color)
 
 
 class VectorDial(NoTouch):
@@ -92,7 +103,9 @@ class VectorDial(NoTouch):
         self.ticks = ticks
         self.xorigin = location[0] + border + radius
         self.yorigin = location[1] + border + radius
-        self.vor = self.xorigin + 1j * self.yorigin  # Origin as a vector
+        self.xo = trig.fixlen(self.xorigin)  # Origin
+        self.yo = trig.fixlen(self.yorigin)
+        self.rlen = trig.fixlen(radius * (1 - self.TICKLEN))  # Length of a unit vector
         self.vectors = set()
         self.drawn = False
 
@@ -103,25 +116,30 @@ class VectorDial(NoTouch):
         radius = self.radius
         xo = self.xorigin
         yo = self.yorigin
-        vor = self.vor
         if self.redraw:  # An overlaying screen has closed. Force redraw.
             self.redraw = False
             self.drawn = False
+            for v in self.vectors:  # Background has been repainted
+                v.shown = False
+        for v in self.vectors:  # Erase all moved pointers before drawing any
+            v.erase()
         if not self.drawn:
             self.drawn = True
-            vtstart = (1 - self.TICKLEN) * radius + 0j  # start of tick
-            vtick = self.TICKLEN * radius + 0j  # tick
-            vrot = cmath.exp(2j * cmath.pi/ticks)  # unit rotation
-            for _ in range(ticks):
-                pline(tft, vor + conj(vtstart), vtick, self.fgcolor)
-                vtick *= vrot
-                vtstart *= vrot
+            rs = self.rlen  # start of tick
+            rt = trig.fixlen(self.TICKLEN * radius)  # tick
+            for tick in range(ticks):
+                a = tick * trig.TURN // ticks
+                c = trig.cos(a)
+                s = trig.sin(a)
+                pline(tft, self.xo + (rs * c >> 14), self.yo - (rs * s >> 14), rt * c >> 14, rt * s >> 14, self.fgcolor)
             tft.draw_circle(xo, yo, radius, self.fgcolor)
 
-        vshort = 1000  # Length of shortest vector
+        r = trig.fixlen(radius)
+        vshort = 0x3fffffff  # Squared length of shortest vector
         for v in self.vectors:
-            val = v.value() * radius  # val is complex
-            vshort = min(vshort, cmath.polar(val)[0])
+            dx = r * v.x >> 14
+            dy = r * v.y >> 14
+            vshort = min(vshort, dx * dx + dy * dy)
             v.show()
-        if isinstance(self.pip, tuple) and vshort > 9:
+        if isinstance(self.pip, tuple) and vshort > 81 * 256:  # 9 pixels
             tft.fill_circle(xo, yo, 3, self.pip)